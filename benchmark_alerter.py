@@ -0,0 +1,261 @@
+"""Benchmark and load test for bittensor_alerter.py without a live chain or Discord.
+
+The subtensor is replaced by a fake whose subnet prices follow a random walk (or a scripted price
+feed), and Discord users by fakes that record the DMs they are sent. For each alert count it
+measures price check latency, DM throughput, save/load time, command latency and peak RSS.
+
+    python benchmark_alerter.py --alerts 10000 100000 1000000
+    python benchmark_alerter.py --alerts 50000 --store sqlite --json > results.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import resource
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import bittensor as bt
+
+class FakeChain:
+    """Subnet prices that move one step per block, by random walk or from a script"""
+
+    def __init__(self, subnets: int, volatility: float, seed: int, script: Optional[List[Dict]] = None):
+        self.rng = random.Random(seed)
+        self.volatility = volatility
+        self.script = script
+        self.block = 1000
+        self.prices = {netuid: self.rng.uniform(0.01, 2.0) for netuid in range(subnets)}
+
+    def advance(self):
+        self.block += 1
+        if self.script:
+            step = self.script[self.block % len(self.script)]
+            self.prices.update({int(netuid): float(price) for netuid, price in step.items()})
+        else:
+            for netuid, price in self.prices.items():
+                self.prices[netuid] = price * math.exp(self.rng.gauss(0, self.volatility))
+
+fake_chain: Optional[FakeChain] = None
+
+class FakeSubtensor:
+    """The subset of bt.subtensor the alerter uses, served from fake_chain"""
+
+    @staticmethod
+    def config():
+        return None
+
+    def __init__(self, config=None):
+        pass
+
+    def get_current_block(self) -> int:
+        return fake_chain.block
+
+    def _subnet(self, netuid: int):
+        return SimpleNamespace(netuid=netuid, price=fake_chain.prices[netuid], subnet_name=f"sn{netuid}")
+
+    def all_subnets(self, block: Optional[int] = None):
+        return [self._subnet(netuid) for netuid in fake_chain.prices]
+
+    def subnet(self, netuid: int, block: Optional[int] = None):
+        return self._subnet(netuid) if netuid in fake_chain.prices else None
+
+    def close(self):
+        pass
+
+class FakeUser:
+    """Discord user that records DMs, taking `latency` seconds per send"""
+
+    def __init__(self, user_id: int, latency: float, inbox: List):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+        self.latency = latency
+        self.inbox = inbox
+
+    async def send(self, content: str):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.inbox.append((self.id, content))
+
+class FakeContext:
+    """Command context in the command channel, recording replies"""
+
+    def __init__(self, author: FakeUser):
+        self.author = author
+        self.guild = SimpleNamespace(id=int(os.environ['ALLOWED_SERVER_ID']))
+        self.channel = SimpleNamespace(id=int(os.environ['COMMAND_CHANNEL_ID']))
+        self.replies: List[str] = []
+
+    async def send(self, content: str = None, **kwargs):
+        self.replies.append(content)
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max in milliseconds"""
+    values = sorted(values)
+    def at(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 3) if values else None
+    return {'p50': at(0.5), 'p95': at(0.95), 'p99': at(0.99), 'max': round(values[-1] * 1000, 3) if values else None}
+
+def peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+def populate(alerter, count: int, users: int, rng: random.Random):
+    """Replace all alerts with `count` alerts a few percent away from the current prices"""
+    alerts = {}
+    subnets = list(fake_chain.prices)
+    for _ in range(count):
+        subnet_uid = rng.choice(subnets)
+        price = fake_chain.prices[subnet_uid]
+        target = price * (1 + rng.choice((-1, 1)) * rng.uniform(0.005, 0.1))
+        alerts.setdefault(subnet_uid, {}).setdefault(rng.randrange(users), []).append({
+            'target_price': target,
+            'initial_price': price
+        })
+    alerter.alert_history.clear()
+    alerter.load_price_alerts(alerts)
+
+async def run_size(alerter, args, count: int, inbox: List) -> Dict:
+    rng = random.Random(args.seed + count)
+    result = {'alerts': count, 'store': args.store}
+
+    started = time.perf_counter()
+    populate(alerter, count, max(1, count // args.alerts_per_user), rng)
+    result['build_s'] = round(time.perf_counter() - started, 3)
+
+    # Persistence: full snapshot, then a cold load (which migrates the snapshot into SQLite the first time)
+    started = time.perf_counter()
+    alerter.save_alerts()
+    result['save_s'] = round(time.perf_counter() - started, 3)
+    snapshot_file = alerter.STATE_SNAPSHOT_FILE if alerter.SNAPSHOT_FORMAT == 'binary' else alerter.ALERTS_FILE
+    result['snapshot_mib'] = round(os.path.getsize(snapshot_file) / 1024 / 1024, 2)
+    started = time.perf_counter()
+    alerter.load_alerts()
+    result['load_s'] = round(time.perf_counter() - started, 3)
+    if args.store == 'sqlite':
+        started = time.perf_counter()
+        alerter.load_alerts()
+        result['reload_s'] = round(time.perf_counter() - started, 3)
+
+    # Price checks, with DMs delivered concurrently by the DM notifier
+    sent_before = alerter.DMS_SENT.values.get((), 0)
+    delivered_before = len(inbox)
+    tick_latencies = []
+    started = time.perf_counter()
+    for _ in range(args.ticks):
+        fake_chain.advance()
+        tick_started = time.perf_counter()
+        await alerter.check_subnet_prices()
+        tick_latencies.append(time.perf_counter() - tick_started)
+    await alerter.notifiers['dm'].queue.join()
+    elapsed = time.perf_counter() - started
+    result['tick_ms'] = percentiles(tick_latencies)
+    result['dms'] = alerter.DMS_SENT.values.get((), 0) - sent_before
+    result['dm_parts'] = len(inbox) - delivered_before
+    result['dms_per_s'] = round(result['dms'] / elapsed, 1) if elapsed else None
+    result['dm_queue_latency_ms'] = {
+        key: round(value * 1000, 3) if value is not None else None
+        for key, value in alerter.notifiers['dm'].stats().items() if key.startswith('latency')
+    }
+    result['alerts_left'] = sum(len(index) for index in alerter.alert_index.values())
+
+    # Command handlers: !setalert and !myalerts from random users
+    command_latencies = {'setalert': [], 'myalerts': []}
+    subnets = list(fake_chain.prices)
+    for i in range(args.commands):
+        user = FakeUser(rng.randrange(max(1, count // args.alerts_per_user)), 0, inbox)
+        ctx = FakeContext(user)
+        subnet_uid = rng.choice(subnets)
+        command_started = time.perf_counter()
+        if i % 2:
+            await alerter.list_alerts.callback(ctx)
+            command_latencies['myalerts'].append(time.perf_counter() - command_started)
+        else:
+            target = fake_chain.prices[subnet_uid] * rng.uniform(0.8, 1.2)
+            await alerter.set_alert.callback(ctx, subnet_uid, f"{target:.6f}")
+            command_latencies['setalert'].append(time.perf_counter() - command_started)
+    result['command_ms'] = {name: percentiles(values) for name, values in command_latencies.items()}
+
+    result['peak_rss_mib'] = peak_rss_mib()
+    return result
+
+def print_result(result: Dict):
+    print(f"\n== {result['alerts']:,} alerts ({result['store']}) ==")
+    print(f"  build {result['build_s']}s, save {result['save_s']}s ({result['snapshot_mib']} MiB), "
+          f"load {result['load_s']}s" + (f", reload {result['reload_s']}s" if 'reload_s' in result else ""))
+    tick = result['tick_ms']
+    print(f"  tick latency ms: p50 {tick['p50']}  p95 {tick['p95']}  p99 {tick['p99']}  max {tick['max']}")
+    print(f"  DMs: {result['dms']} ({result['dm_parts']} messages), {result['dms_per_s']}/s, "
+          f"queue latency ms {result['dm_queue_latency_ms']}; {result['alerts_left']:,} alerts left")
+    for name, latency in result['command_ms'].items():
+        print(f"  !{name} ms: p50 {latency['p50']}  p95 {latency['p95']}  max {latency['max']}")
+    print(f"  peak RSS {result['peak_rss_mib']} MiB")
+
+async def run(args) -> List[Dict]:
+    global fake_chain
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    fake_chain = FakeChain(args.subnets, args.volatility, args.seed, script)
+
+    # The alerter opens chain connections through bt.subtensor, so the fake has to be in place first
+    bt.subtensor = FakeSubtensor
+    os.environ.setdefault('ALLOWED_SERVER_ID', '1')
+    os.environ.setdefault('COMMAND_CHANNEL_ID', '2')
+    os.environ['ALERT_STORE'] = args.store
+    os.environ['LOG_LEVEL'] = 'DEBUG' if args.verbose else 'WARNING'
+    os.environ['PRICE_HISTORY_FILE'] = os.path.join(args.workdir, 'price_history.bin')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bittensor_alerter as alerter
+
+    inbox = []
+    alerter.bot.get_user = lambda user_id: FakeUser(user_id, args.dm_latency, inbox)
+
+    results = []
+    alerter.open_price_history()
+    alerter.notifiers['dm'].start()
+    for count in sorted(args.alerts):
+        # Each size gets its own files so snapshots and databases do not carry over
+        alerter.rotate_journal()
+        if alerter.alert_store is not None:
+            alerter.alert_store.conn.close()
+            alerter.alert_store = None
+        os.chdir(tempfile.mkdtemp(prefix=f'{count}-', dir=args.workdir))
+        result = await run_size(alerter, args, count, inbox)
+        results.append(result)
+        if not args.json:
+            print_result(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bittensor_alerter.py against a fake chain and Discord")
+    parser.add_argument('--alerts', type=int, nargs='+', default=[10000, 100000], help="alert counts to run")
+    parser.add_argument('--store', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--subnets', type=int, default=128)
+    parser.add_argument('--alerts-per-user', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=20, help="price checks per alert count")
+    parser.add_argument('--commands', type=int, default=200, help="command invocations per alert count")
+    parser.add_argument('--volatility', type=float, default=0.01, help="per-block log price change (random walk)")
+    parser.add_argument('--script', help="JSON list of {netuid: price} steps to replay instead of a random walk")
+    parser.add_argument('--dm-latency', type=float, default=0.005, help="seconds each fake DM send takes")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help="directory for alert files (default: a new temporary directory)")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show the alerter's debug logging")
+    args = parser.parse_args()
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='alerter-bench-'))
+    os.makedirs(args.workdir, exist_ok=True)
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
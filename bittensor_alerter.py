@@ -3,18 +3,256 @@ import discord
 from discord.ext import commands
 import bittensor as bt
 from dotenv import load_dotenv
-import schedule
 import time
 import asyncio
-from datetime import datetime
-from typing import Dict, List
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 import json
 import subprocess
 import re
+import queue
+import bisect
+import random
+import sqlite3
+import threading
+import socket
+import mmap
+import gzip
+import struct
+import sys
+from array import array
+import logging
+import contextlib
+import abc
+import math
+import argparse
+import urllib.parse
+import aiohttp
+import numpy as np
+from multiprocessing.connection import Listener, Client, AuthenticationError
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Process start, for the alerter_startup_seconds metric
+STARTED_AT = time.monotonic()
 
 # Load environment variables
 load_dotenv()
 
+# Logging: LOG_LEVEL (DEBUG, INFO, WARNING, ERROR) and LOG_FORMAT (text, or json for one object per line)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+class JsonLogFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+logger = logging.getLogger('bittensor_alerter')
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(
+    JsonLogFormatter() if LOG_FORMAT == 'json'
+    else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+)
+logger.addHandler(log_handler)
+logger.setLevel(LOG_LEVEL)
+# discord.py logs through the root logger; keep our lines out of its handler so they are not printed twice
+logger.propagate = False
+
+# Metrics endpoint (disabled unless METRICS_PORT is set)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metric:
+    """A Prometheus counter or gauge. With `collect`, the samples are computed at scrape time instead"""
+
+    def __init__(self, name: str, help: str, kind: str, labels: Tuple[str, ...] = (), collect=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = labels
+        # collect() returns {label values tuple: value}
+        self.collect = collect
+        self.values: Dict[tuple, float] = {}
+        # Updated from the chain worker threads as well as the event loop
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> tuple:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def format_labels(self, key: tuple, **extra) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra.items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{label}="{escape_label_value(value)}"' for label, value in pairs) + '}'
+
+    def samples(self) -> List[str]:
+        if self.collect is not None:
+            values = self.collect()
+        else:
+            with self.lock:
+                values = dict(self.values)
+        return [f"{self.name}{self.format_labels(key)} {value}" for key, value in values.items()]
+
+class Histogram(Metric):
+    """A Prometheus histogram of durations in seconds"""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS):
+        super().__init__(name, help, 'histogram', labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            # [count per bucket..., sum, count]
+            state = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                state[position] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = {key: list(state) for key, state in self.values.items()}
+        lines = []
+        for key, state in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self.format_labels(key, le=bound)} {cumulative}")
+            lines.append(f"{self.name}_bucket{self.format_labels(key, le='+Inf')} {state[-1]}")
+            lines.append(f"{self.name}_sum{self.format_labels(key)} {state[-2]}")
+            lines.append(f"{self.name}_count{self.format_labels(key)} {state[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """Metrics served in the Prometheus text format on a local HTTP endpoint"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = (), collect=None) -> Metric:
+        return self.register(Metric(name, help, 'counter', labels, collect))
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = (), collect=None) -> Metric:
+        return self.register(Metric(name, help, 'gauge', labels, collect))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Histogram:
+        return self.register(Histogram(name, help, labels))
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.error(f"Error collecting metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    async def start(self, host: str, port: int):
+        """Serve GET /metrics (only once)"""
+        if self.server is not None:
+            return
+        self.server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = (await asyncio.wait_for(reader.readline(), 5)).split()
+            # Skip the headers
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+            if len(request) >= 2 and request[1].split(b'?')[0] == b'/metrics':
+                status, body = '200 OK', self.render().encode()
+            else:
+                status, body = '404 Not Found', b'Not found\n'
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+metrics = MetricsRegistry()
+SWEEP_DURATION = metrics.histogram('alerter_sweep_duration_seconds', 'Time to fetch prices and evaluate alerts', ('mode',))
+SWEEP_FAILURES = metrics.counter('alerter_sweep_failures_total', 'Price checks that failed', ('mode',))
+RPC_DURATION = metrics.histogram('alerter_rpc_duration_seconds', 'Subtensor call latency', ('method',))
+RPC_FAILURES = metrics.counter('alerter_rpc_failures_total', 'Subtensor calls that raised', ('method',))
+SAVE_DURATION = metrics.histogram('alerter_save_duration_seconds', 'Time to write an alert snapshot', ('kind',))
+DM_SEND_DURATION = metrics.histogram('alerter_dm_send_duration_seconds', 'Discord DM send latency')
+DMS_SENT = metrics.counter('alerter_dms_sent_total', 'Alert DMs delivered')
+TRIGGERS = metrics.counter('alerter_alerts_triggered_total', 'Alerts triggered', ('kind',))
+NOTIFY_SEND_DURATION = metrics.histogram('alerter_notify_send_duration_seconds', 'Notification batch send latency', ('target',))
+NOTIFICATIONS_SENT = metrics.counter('alerter_notifications_sent_total', 'Notifications delivered', ('target',))
+NOTIFY_FAILURES = metrics.counter('alerter_notify_failures_total', 'Notifications given up on or dropped', ('target', 'reason'))
+NOTIFY_RETRIES = metrics.counter('alerter_notify_retries_total', 'Notification batches retried', ('target',))
+STARTUP_SECONDS = metrics.gauge(
+    'alerter_startup_seconds', 'Seconds after start that each startup phase (chain, state, ready) finished', ('phase',)
+)
+
+def collect_active_alerts() -> Dict[tuple, float]:
+    values = {(subnet_uid, 'price'): len(index) for subnet_uid, index in alert_index.items()}
+    for subnet_uid, count in zip(*np.unique(condition_alerts.subnets, return_counts=True)):
+        values[(int(subnet_uid), 'condition')] = int(count)
+    return values
+
+def collect_price_cache() -> Dict[tuple, float]:
+    stats = price_cache.stats()
+    return {('hit',): stats['hits'], ('stale',): stats['stale_hits'], ('miss',): stats['misses']}
+
+metrics.gauge('alerter_active_alerts', 'Active alerts per subnet', ('subnet', 'kind'), collect=collect_active_alerts)
+metrics.gauge(
+    'alerter_notify_queue_depth', 'Notifications waiting for delivery per target', ('target',),
+    collect=lambda: {(name,): notifier.queue.qsize() for name, notifier in notifiers.items()}
+)
+metrics.counter('alerter_price_cache_lookups_total', 'Price cache lookups by result', ('result',), collect=collect_price_cache)
+
 # Discord bot setup
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 ALLOWED_SERVER_ID = int(os.getenv('ALLOWED_SERVER_ID'))
@@ -24,197 +262,2948 @@ COMMAND_CHANNEL_ID = int(os.getenv('COMMAND_CHANNEL_ID'))
 intents = discord.Intents.default()
 intents.message_content = True
 intents.dm_messages = True  # Enable DM messages
-bot = commands.Bot(command_prefix='!', intents=intents)
 
-# Initialize Bittensor
-bt.logging.set_trace(True)
+class AlerterBot(commands.Bot):
+    async def setup_hook(self):
+        # Runs during login, before the gateway connects: load state and open the chain meanwhile
+        global startup_task, state_loaded
+        await start_metrics()
+        state_loaded = asyncio.Event()
+        startup_task = asyncio.create_task(warm_up())
+
+    async def close(self):
+        # Stop the price checks and flush pending alert changes before disconnecting
+        await price_scheduler.stop()
+        await block_watcher.stop()
+        await history_pruner.stop()
+        for notifier in notifiers.values():
+            await notifier.stop()
+        if shard_hub is not None:
+            shard_hub.stop()
+        sync_journal()
+        if price_history is not None:
+            price_history.mm.flush()
+        await super().close()
+
+bot = AlerterBot(command_prefix='!', intents=intents)
+
+# Initialize Bittensor; BITTENSOR_TRACE=true turns on its (verbose) trace logging. Chain connections are
+# opened on first use (or warmed up while the bot logs in), so importing this module never waits on the chain.
+if os.getenv('BITTENSOR_TRACE', 'false').lower() in ('1', 'true', 'yes'):
+    bt.logging.set_trace(True)
 config = bt.subtensor.config()
-subtensor = bt.subtensor(config=config)
+
+# Chain client settings
+CHAIN_POOL_SIZE = int(os.getenv('CHAIN_POOL_SIZE', '4'))
+CHAIN_CALL_TIMEOUT = float(os.getenv('CHAIN_CALL_TIMEOUT', '30'))
+
+class ChainClient:
+    """Run blocking subtensor calls on a bounded thread pool so they never block the Discord event loop"""
+
+    def __init__(self, pool_size: int, timeout: float):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='chain')
+        # Idle websocket connections; they are opened on demand, up to one per worker thread
+        self.connections = queue.Queue()
+        self.in_flight: Dict[tuple, asyncio.Future] = {}
+
+    def _open(self):
+        self.connections.put(bt.subtensor(config=config))
+
+    async def connect(self):
+        """Open the first connection ahead of the first call, e.g. while the Discord gateway connects"""
+        if not self.connections.empty():
+            return
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(self.executor, self._open), self.timeout)
+            STARTUP_SECONDS.set(time.monotonic() - STARTED_AT, phase='chain')
+        except Exception as e:
+            logger.warning(f"Could not connect to the chain yet, will retry on first use: {e}")
+
+    def _run(self, method, args: tuple):
+        """Run a subtensor method, or a function taking the subtensor first, on a pooled connection
+        (called on a worker thread)"""
+        try:
+            connection = self.connections.get_nowait()
+        except queue.Empty:
+            connection = bt.subtensor(config=config)
+        name = method if isinstance(method, str) else method.__name__
+        started = time.perf_counter()
+        try:
+            result = getattr(connection, method)(*args) if isinstance(method, str) else method(connection, *args)
+        except Exception:
+            RPC_FAILURES.inc(method=name)
+            # Drop the connection in case the websocket is broken; a fresh one is opened next time
+            try:
+                connection.close()
+            except Exception:
+                pass
+            raise
+        finally:
+            RPC_DURATION.observe(time.perf_counter() - started, method=name)
+        self.connections.put(connection)
+        return result
+
+    async def call(self, method, *args):
+        """Call a subtensor method (by name, or a function taking the subtensor first) without blocking,
+        sharing the result with identical in-flight calls"""
+        key = (method, args)
+        future = self.in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(asyncio.wait_for(
+                loop.run_in_executor(self.executor, self._run, method, args),
+                timeout=self.timeout
+            ))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Shield so one cancelled caller does not cancel the call for everyone else waiting on it
+        return await asyncio.shield(future)
+
+chain = ChainClient(CHAIN_POOL_SIZE, CHAIN_CALL_TIMEOUT)
+
+# Price check schedule: seconds between sweeps and maximum random delay added to each
+CHECK_INTERVAL = float(os.getenv('CHECK_INTERVAL', '60'))
+CHECK_JITTER = float(os.getenv('CHECK_JITTER', '5'))
+
+# 'poll' checks every CHECK_INTERVAL; 'blocks' checks on every new block and polls only if the
+# block subscription has been silent for BLOCK_STALE_SECONDS
+PRICE_CHECK_MODE = os.getenv('PRICE_CHECK_MODE', 'poll')
+BLOCK_STALE_SECONDS = float(os.getenv('BLOCK_STALE_SECONDS', '60'))
+
+# Price cache: entries younger than the TTL are served as is; older ones up to the max
+# staleness are served while refreshing in the background
+PRICE_CACHE_TTL = float(os.getenv('PRICE_CACHE_TTL', '15'))
+PRICE_CACHE_MAX_STALE = float(os.getenv('PRICE_CACHE_MAX_STALE', '120'))
+
+# Price history ring buffers: samples kept per subnet, highest netuid + 1 tracked, and how
+# often the memory-mapped file is flushed to disk
+PRICE_HISTORY_FILE = os.getenv('PRICE_HISTORY_FILE', 'price_history.bin')
+PRICE_HISTORY_SUBNETS = int(os.getenv('PRICE_HISTORY_SUBNETS', '256'))
+PRICE_HISTORY_SAMPLES = int(os.getenv('PRICE_HISTORY_SAMPLES', '4320'))
+PRICE_HISTORY_FLUSH_INTERVAL = float(os.getenv('PRICE_HISTORY_FLUSH_INTERVAL', '300'))
+
+# DM delivery settings
+NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', '8'))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '5'))
+NOTIFY_RETRY_DELAY = float(os.getenv('NOTIFY_RETRY_DELAY', '2'))
+DISCORD_MESSAGE_LIMIT = 2000
+
+# Notification targets besides Discord DMs ('dm'), as comma-separated name=kind:address pairs. Kinds are
+# webhook:<http(s) URL>, unix:<socket path>, file:<path>, channel:<Discord channel ID> and memory:[delay],
+# a local sink for tests. Alerts set without `to:` go to NOTIFY_DEFAULT_TARGETS.
+NOTIFY_TARGETS = os.getenv('NOTIFY_TARGETS', '')
+NOTIFY_DEFAULT_TARGETS = [name.strip() for name in os.getenv('NOTIFY_DEFAULT_TARGETS', 'dm').split(',') if name.strip()]
+# Per-target defaults; override for one target with NOTIFY_<NAME>_CONCURRENCY, _MAX_ATTEMPTS, _RETRY_DELAY or _BATCH_SIZE
+NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', '100'))
+NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', '10000'))
+NOTIFY_TIMEOUT = float(os.getenv('NOTIFY_TIMEOUT', '10'))
+
+# Alert history entries shown per page
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '10'))
+
+# Cache of fetched Discord users
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '3600'))
 
 # File to store alerts
 ALERTS_FILE = 'price_alerts.json'
 HISTORY_FILE = 'alert_history.json'
+CONDITIONS_FILE = 'condition_alerts.json'
+ROLLUPS_FILE = 'history_rollups.json'
+
+# Snapshot format in JSON mode: 'binary' writes the alert and history columns as raw arrays to
+# STATE_SNAPSHOT_FILE, which loads much faster than the JSON files; 'json' writes the files above
+SNAPSHOT_FORMAT = os.getenv('SNAPSHOT_FORMAT', 'binary')
+STATE_SNAPSHOT_FILE = 'alerts_state.bin'
+SNAPSHOT_MAGIC = b'BTALRT01'
+
+# History retention: raw entries older than HISTORY_RETENTION_DAYS, or beyond HISTORY_MAX_ENTRIES per subnet,
+# are folded into daily rollups (kept HISTORY_ROLLUP_DAYS) and archived to one gzip file per day
+# (the newest HISTORY_ARCHIVE_DAYS are kept). 0 disables a limit.
+HISTORY_RETENTION_DAYS = float(os.getenv('HISTORY_RETENTION_DAYS', '30'))
+HISTORY_MAX_ENTRIES = int(os.getenv('HISTORY_MAX_ENTRIES', '10000'))
+HISTORY_ROLLUP_DAYS = int(os.getenv('HISTORY_ROLLUP_DAYS', '730'))
+HISTORY_ARCHIVE_DIR = os.getenv('HISTORY_ARCHIVE_DIR', 'history_archive')
+HISTORY_ARCHIVE_DAYS = int(os.getenv('HISTORY_ARCHIVE_DAYS', '90'))
+HISTORY_PRUNE_INTERVAL = float(os.getenv('HISTORY_PRUNE_INTERVAL', '3600'))
+# Expired entries archived and deleted per step, so pruning never holds a large batch or a long transaction
+HISTORY_PRUNE_BATCH = 5000
+
+# Write-ahead journal of alert changes since the last snapshot
+JOURNAL_FILE = 'alerts_journal.jsonl'
+JOURNAL_COMPACTING_FILE = 'alerts_journal.compacting.jsonl'
+# Lists the snapshot files written out in full while they are renamed into place
+SNAPSHOT_COMMIT_FILE = 'alerts_snapshot.commit'
+JOURNAL_FSYNC_INTERVAL = float(os.getenv('JOURNAL_FSYNC_INTERVAL', '1'))
+JOURNAL_COMPACT_ENTRIES = int(os.getenv('JOURNAL_COMPACT_ENTRIES', '1000'))
+
+# Storage backend: 'json' (snapshot files + journal) or 'sqlite'
+ALERT_STORE = os.getenv('ALERT_STORE', 'json')
+SQLITE_FILE = os.getenv('SQLITE_FILE', 'alerts.db')
+
+# Sharded deployment: process role (all, frontend, fetcher or evaluator), evaluator shard count and IPC endpoint
+PROCESS_ROLE = os.getenv('PROCESS_ROLE', 'all')
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '1'))
+SHARD_ADDRESS = os.getenv('SHARD_ADDRESS', 'alerter.sock')
+DEFAULT_SHARD_AUTHKEY = b'bittensor-alerter'
+SHARD_AUTHKEY = os.getenv('SHARD_AUTHKEY', DEFAULT_SHARD_AUTHKEY.decode()).encode()
+# Keys anyone can know: the built-in default and the placeholder older .env.example files shipped
+PUBLIC_SHARD_AUTHKEYS = (DEFAULT_SHARD_AUTHKEY, b'change-me')
+HISTORY_PAGE_ROWS = 500
+
+# Directions of triggered alerts, stored in history as codes into DIRECTIONS: the price alert outcomes,
+# then one per condition alert kind and side. The measured move or volatility only goes into the DM.
+DIRECTIONS: List[str] = [
+    'increased', 'decreased', 'matched',
+    'moved up', 'moved down', 'crossed above its moving average', 'crossed below its moving average',
+    'volatility above threshold'
+]
+direction_codes: Dict[str, int] = {direction: code for code, direction in enumerate(DIRECTIONS)}
+# Prefixes of the free-text descriptions older versions stored as condition alert directions
+LEGACY_DIRECTION_PREFIXES = (
+    ('moved +', 'moved up'), ('moved -', 'moved down'),
+    ('crossed above', 'crossed above its moving average'), ('crossed below', 'crossed below its moving average'),
+    ('volatility', 'volatility above threshold')
+)
+
+# Notification targets chosen per alert, stored in the alert columns as codes into NOTIFY_TARGET_SETS.
+# Code 0, no targets of its own, means NOTIFY_DEFAULT_TARGETS.
+NOTIFY_TARGET_SETS: List[Tuple[str, ...]] = [()]
+notify_codes: Dict[Tuple[str, ...], int] = {(): 0}
+
+def notify_code(targets: Optional[List[str]]) -> int:
+    key = tuple(targets or ())
+    code = notify_codes.get(key)
+    if code is None:
+        code = notify_codes[key] = len(NOTIFY_TARGET_SETS)
+        NOTIFY_TARGET_SETS.append(key)
+    return code
+
+def direction_code(direction: str) -> int:
+    code = direction_codes.get(direction)
+    if code is None:
+        for prefix, fixed in LEGACY_DIRECTION_PREFIXES:
+            if direction.startswith(prefix):
+                return direction_codes[fixed]
+        code = direction_codes[direction] = len(DIRECTIONS)
+        DIRECTIONS.append(direction)
+    return code
+
+def condition_direction(alert: Dict, price: float, target: float) -> str:
+    """The fixed DIRECTIONS entry for a fired condition alert"""
+    if alert['type'] == 'pct':
+        return 'moved up' if alert['threshold'] >= 0 else 'moved down'
+    if alert['type'] == 'ma':
+        return 'crossed above its moving average' if price > target else 'crossed below its moving average'
+    return 'volatility above threshold'
+
+def epoch_seconds(timestamp: str) -> int:
+    return int(datetime.fromisoformat(timestamp).timestamp())
+
+class AlertIndex:
+    """One subnet's active price alerts, stored column-wise and sorted by target so a new price finds every
+    triggered alert with one bisect.
+    
+    Each side keeps parallel arrays of targets, user IDs, initial prices and notification target codes
+    (28 bytes per alert). Alerts enter and leave as {'target_price', 'initial_price'} dicts, plus 'notify'
+    when they have their own targets, the format of the JSON files and journal.
+    """
+
+    def __init__(self):
+        # Alerts that fire when price >= target, sorted by target
+        self.rising = (array('d'), array('q'), array('d'), array('i'))
+        # Alerts that fire when price <= target, sorted by target
+        self.falling = (array('d'), array('q'), array('d'), array('i'))
+
+    def __len__(self):
+        return len(self.rising[0]) + len(self.falling[0])
+
+    @property
+    def columns(self) -> Tuple[array, ...]:
+        return self.rising + self.falling
+
+    def _side(self, alert: Dict) -> Tuple[array, array, array, array]:
+        return self.rising if alert['target_price'] > alert['initial_price'] else self.falling
+
+    @staticmethod
+    def _alert(side: Tuple[array, array, array, array], position: int) -> Dict:
+        alert = {'target_price': side[0][position], 'initial_price': side[2][position]}
+        if side[3][position]:
+            alert['notify'] = list(NOTIFY_TARGET_SETS[side[3][position]])
+        return alert
+
+    @staticmethod
+    def _finite(alert: Dict) -> bool:
+        # A NaN target would break the sort order every bisect relies on, misfiring other users' alerts
+        if math.isfinite(alert['target_price']) and math.isfinite(alert['initial_price']):
+            return True
+        logger.warning(f"Ignoring alert with non-finite prices: {alert}")
+        return False
+
+    def add(self, user_id: int, alert: Dict):
+        """Insert an alert at its sorted position; alerts with non-finite prices are dropped"""
+        if not self._finite(alert):
+            return
+        targets, user_ids, initial_prices, notify = self._side(alert)
+        position = bisect.bisect_right(targets, alert['target_price'])
+        targets.insert(position, alert['target_price'])
+        user_ids.insert(position, user_id)
+        initial_prices.insert(position, alert['initial_price'])
+        notify.insert(position, notify_code(alert.get('notify')))
+
+    def extend(self, alerts):
+        """Add many (user_id, alert) pairs, sorting once instead of inserting one at a time"""
+        alerts = [(user_id, alert) for user_id, alert in alerts if self._finite(alert)]
+        for side in (self.rising, self.falling):
+            rows = list(zip(*side))
+            rows.extend(
+                (alert['target_price'], user_id, alert['initial_price'], notify_code(alert.get('notify')))
+                for user_id, alert in alerts if self._side(alert) is side
+            )
+            # Stable, so alerts with equal targets keep their order
+            rows.sort(key=lambda row: row[0])
+            for column, values in zip(side, zip(*rows) if rows else ((),) * len(side)):
+                del column[:]
+                column.extend(values)
+
+    def drop_non_finite(self):
+        """Drop alerts with non-finite prices loaded from raw columns, restoring the sort order they broke"""
+        if all(np.isfinite(np.frombuffer(column, dtype=np.float64)).all()
+               for side in (self.rising, self.falling) for column in (side[0], side[2]) if column):
+            return
+        alerts = [(user_id, alert) for user_id, user_alerts in self.to_dict().items() for alert in user_alerts]
+        for column in self.columns:
+            del column[:]
+        self.extend(alerts)
+
+    def remove(self, user_id: int, alert: Dict) -> bool:
+        """Remove one alert with these values, if it is still in the index"""
+        side = self._side(alert)
+        targets, user_ids, initial_prices, _ = side
+        start = bisect.bisect_left(targets, alert['target_price'])
+        end = bisect.bisect_right(targets, alert['target_price'])
+        for position in range(start, end):
+            if user_ids[position] == user_id and initial_prices[position] == alert['initial_price']:
+                for column in side:
+                    del column[position]
+                return True
+        return False
+
+    def _user_positions(self, side: Tuple[array, array, array, array], user_id: int) -> List[int]:
+        if not side[1]:
+            return []
+        return np.flatnonzero(np.frombuffer(side[1], dtype=np.int64) == user_id).tolist()
+
+    def remove_user(self, user_id: int) -> int:
+        """Remove all of a user's alerts, returning how many there were"""
+        removed = 0
+        for side in (self.rising, self.falling):
+            positions = self._user_positions(side, user_id)
+            for position in reversed(positions):
+                for column in side:
+                    del column[position]
+            removed += len(positions)
+        return removed
+
+    def user_alerts(self, user_id: int) -> List[Dict]:
+        return [
+            self._alert(side, position)
+            for side in (self.rising, self.falling)
+            for position in self._user_positions(side, user_id)
+        ]
+
+    def to_dict(self) -> Dict[int, List[Dict]]:
+        """All alerts as {user_id: [alert, ...]}"""
+        alerts: Dict[int, List[Dict]] = {}
+        for side in (self.rising, self.falling):
+            for position, user_id in enumerate(side[1]):
+                alerts.setdefault(user_id, []).append(self._alert(side, position))
+        return alerts
+
+    def pop_triggered(self, price: float) -> List[Tuple[int, Dict]]:
+        """Remove and return every (user_id, alert) triggered by this price"""
+        end = bisect.bisect_right(self.rising[0], price)
+        triggered = [(self.rising[1][position], self._alert(self.rising, position)) for position in range(end)]
+        for column in self.rising:
+            del column[:end]
+        
+        start = bisect.bisect_left(self.falling[0], price)
+        triggered.extend(
+            (self.falling[1][position], self._alert(self.falling, position))
+            for position in range(start, len(self.falling[0]))
+        )
+        for column in self.falling:
+            del column[start:]
+        return triggered
+
+class AlertHistoryLog:
+    """One subnet's triggered alerts, stored column-wise with epoch-second timestamps and direction codes.
+    
+    Entries enter and leave in the JSON history format, with ISO timestamps and direction strings.
+    """
+
+    def __init__(self):
+        self.user_ids = array('q')
+        self.target_prices = array('d')
+        self.initial_prices = array('d')
+        self.triggered_prices = array('d')
+        self.timestamps = array('q')
+        self.directions = array('i')
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def columns(self) -> Tuple[array, ...]:
+        return (self.user_ids, self.target_prices, self.initial_prices,
+                self.triggered_prices, self.timestamps, self.directions)
+
+    def append(self, entry: Dict):
+        self.user_ids.append(int(entry['user_id']))
+        self.target_prices.append(float(entry['target_price']))
+        self.initial_prices.append(float(entry['initial_price']))
+        self.triggered_prices.append(float(entry['triggered_price']))
+        self.timestamps.append(epoch_seconds(entry['timestamp']))
+        self.directions.append(direction_code(entry['direction']))
+
+    def entry(self, position: int) -> Dict:
+        return {
+            'user_id': self.user_ids[position],
+            'target_price': self.target_prices[position],
+            'initial_price': self.initial_prices[position],
+            'triggered_price': self.triggered_prices[position],
+            'direction': DIRECTIONS[self.directions[position]],
+            'timestamp': datetime.fromtimestamp(self.timestamps[position]).isoformat()
+        }
+
+    def matching(self, user_id: Optional[int] = None, since: Optional[int] = None, until: Optional[int] = None) -> np.ndarray:
+        """Positions of the entries by a user and/or in [since, until) epoch seconds"""
+        mask = np.ones(len(self), dtype=bool)
+        if len(self):
+            if user_id is not None:
+                mask &= np.frombuffer(self.user_ids, dtype=np.int64) == user_id
+            timestamps = np.frombuffer(self.timestamps, dtype=np.int64)
+            if since is not None:
+                mask &= timestamps >= since
+            if until is not None:
+                mask &= timestamps < until
+            del timestamps
+        return np.flatnonzero(mask)
+
+    def to_list(self) -> List[Dict]:
+        return [self.entry(position) for position in range(len(self))]
+
+    def expired_count(self, cutoff: Optional[float], max_entries: int) -> int:
+        """How many of the oldest entries are past the cutoff time or beyond the newest max_entries"""
+        count = max(0, len(self) - max_entries) if max_entries else 0
+        if cutoff is not None and len(self):
+            recent = np.frombuffer(self.timestamps, dtype=np.int64) >= cutoff
+            # Entries are appended in time order, so everything before the first recent one has expired
+            count = max(count, int(recent.argmax()) if recent.any() else len(self))
+            del recent
+        return count
+
+    def drop_oldest(self, count: int):
+        for column in self.columns:
+            del column[:count]
+
+# Active price alerts: {subnet_uid: AlertIndex}
+alert_index: Dict[int, AlertIndex] = {}
+
+# Alert history: {subnet_uid: AlertHistoryLog}
+alert_history: Dict[int, AlertHistoryLog] = {}
+
+# Daily summaries of history past its retention: {subnet_uid: {'YYYY-MM-DD': [triggers, low price, high price]}}
+history_rollups: Dict[int, Dict[str, List]] = {}
+
+def rollup_entries(entries) -> Dict[int, Dict[str, List]]:
+    """Summarize (subnet_uid, entry) pairs into daily trigger counts and triggered price ranges"""
+    rollups: Dict[int, Dict[str, List]] = {}
+    for subnet_uid, entry in entries:
+        day = entry['timestamp'][:10]
+        price = entry['triggered_price']
+        rollup = rollups.setdefault(subnet_uid, {}).get(day)
+        if rollup is None:
+            rollups[subnet_uid][day] = [1, price, price]
+        else:
+            rollup[0] += 1
+            rollup[1] = min(rollup[1], price)
+            rollup[2] = max(rollup[2], price)
+    return rollups
+
+def merge_rollups(target: Dict[int, Dict[str, List]], rollups: Dict[int, Dict[str, List]]):
+    """Add rollups into target in place"""
+    for subnet_uid, days in rollups.items():
+        subnet_rollups = target.setdefault(int(subnet_uid), {})
+        for day, (count, low, high) in days.items():
+            existing = subnet_rollups.get(day)
+            if existing is None:
+                subnet_rollups[day] = [count, low, high]
+            else:
+                existing[0] += count
+                existing[1] = min(existing[1], low)
+                existing[2] = max(existing[2], high)
+
+def rollup_cutoff_day() -> Optional[str]:
+    """Rollups for days before this one are dropped"""
+    if not HISTORY_ROLLUP_DAYS:
+        return None
+    return (datetime.now() - timedelta(days=HISTORY_ROLLUP_DAYS)).date().isoformat()
+
+def expire_rollups():
+    cutoff = rollup_cutoff_day()
+    if cutoff is None:
+        return
+    for subnet_uid in list(history_rollups):
+        days = history_rollups[subnet_uid]
+        for day in [day for day in days if day < cutoff]:
+            del days[day]
+        if not days:
+            del history_rollups[subnet_uid]
+
+def prune_history_log(subnet_uid: int, count: int, rollups: Dict[str, List]):
+    """Drop a subnet's oldest `count` history entries, keeping their rollups"""
+    alert_history[subnet_uid].drop_oldest(count)
+    merge_rollups(history_rollups, {subnet_uid: rollups})
+
+def build_alert_index(alerts: Dict[int, Dict[int, List[Dict]]]) -> Dict[int, AlertIndex]:
+    """Index {subnet_uid: {user_id: [alert, ...]}} by subnet"""
+    indexes = {}
+    for subnet_uid, subnet_alerts in alerts.items():
+        index = AlertIndex()
+        index.extend(
+            (int(user_id), alert)
+            for user_id, user_alerts in subnet_alerts.items()
+            for alert in user_alerts
+        )
+        if index:
+            indexes[int(subnet_uid)] = index
+    return indexes
+
+def load_price_alerts(alerts: Dict[int, Dict[int, List[Dict]]]):
+    """Replace all price alerts with {subnet_uid: {user_id: [alert, ...]}}"""
+    global alert_index
+    alert_index = build_alert_index(alerts)
+
+def price_alerts_snapshot() -> Dict[int, Dict[int, List[Dict]]]:
+    """All price alerts as {subnet_uid: {user_id: [alert, ...]}}, the ALERTS_FILE format"""
+    return {subnet_uid: index.to_dict() for subnet_uid, index in alert_index.items() if index}
+
+def history_snapshot() -> Dict[int, List[Dict]]:
+    """All history as {subnet_uid: [entry, ...]}, the HISTORY_FILE format"""
+    return {subnet_uid: log.to_list() for subnet_uid, log in alert_history.items()}
+
+def append_history(subnet_uid: int, entry: Dict):
+    log = alert_history.get(subnet_uid)
+    if log is None:
+        log = alert_history[subnet_uid] = AlertHistoryLog()
+    log.append(entry)
+
+def count_price_alerts() -> int:
+    return sum(len(index) for index in alert_index.values())
+
+def index_alert(subnet_uid: int, user_id: int, alert: Dict):
+    """Add an alert to the index without persisting it"""
+    index = alert_index.get(subnet_uid)
+    if index is None:
+        index = alert_index[subnet_uid] = AlertIndex()
+    index.add(user_id, alert)
+
+def unindex_alert(subnet_uid: int, user_id: int, alert: Dict) -> bool:
+    """Remove one alert with these values from the index without persisting, if it is still there"""
+    index = alert_index.get(subnet_uid)
+    if index is None or not index.remove(user_id, alert):
+        return False
+    if not index:
+        del alert_index[subnet_uid]
+    return True
+
+def add_alert(subnet_uid: int, user_id: int, alert: Dict):
+    """Add an alert to the index"""
+    index_alert(subnet_uid, user_id, alert)
+    if alert_store is not None:
+        alert_store.add_alert(subnet_uid, user_id, alert)
+    else:
+        journal_append({'op': 'add', 'subnet': subnet_uid, 'user_id': user_id, **alert})
+    if shard_hub is not None:
+        shard_hub.publish(subnet_uid, {'type': 'add', 'subnet': subnet_uid, 'user_id': user_id, 'alert': alert})
+
+def record_trigger(subnet_uid: int, user_id: int, alert: Dict, entry: Dict):
+    """Add the history entry of a triggered alert that already left the index"""
+    if alert_store is not None:
+        alert_store.record_history(subnet_uid, entry, remove_alert=True)
+    else:
+        append_history(subnet_uid, entry)
+        journal_append({'op': 'trigger', 'subnet': subnet_uid, 'entry': entry})
+
+def add_condition_alert(alert: Dict) -> Dict:
+    """Add a percent-move, moving-average or volatility alert"""
+    alert = condition_alerts.add(alert)
+    if alert_store is not None:
+        alert_store.add_condition(alert)
+    else:
+        journal_append({'op': 'condition_add', 'subnet': alert['subnet'], 'alert': alert})
+    if shard_hub is not None:
+        shard_hub.publish(alert['subnet'], {'type': 'condition_add', 'alert': alert})
+    return alert
+
+def record_condition_trigger(alert: Dict, entry: Dict):
+    """Add the history entry of a condition alert that already left condition_alerts"""
+    if alert_store is not None:
+        alert_store.record_history(alert['subnet'], entry, condition_id=alert['id'])
+    else:
+        append_history(alert['subnet'], entry)
+        journal_append({'op': 'condition_trigger', 'subnet': alert['subnet'], 'id': alert['id'], 'entry': entry})
+
+def record_history(subnet_uid: int, entry: Dict):
+    """Add a history entry for an alert that was never stored"""
+    if alert_store is not None:
+        alert_store.record_history(subnet_uid, entry)
+    else:
+        append_history(subnet_uid, entry)
+        journal_append({'op': 'history', 'subnet': subnet_uid, 'entry': entry})
+
+def unindex_user_alerts(subnet_uid: int, user_id: int) -> bool:
+    """Drop all of a user's price and condition alerts for a subnet from memory, without persisting"""
+    removed = condition_alerts.remove_user(subnet_uid, user_id)
+    index = alert_index.get(subnet_uid)
+    if index is not None:
+        removed += index.remove_user(user_id)
+        if not index:
+            del alert_index[subnet_uid]
+    return bool(removed)
+
+def remove_user_alerts(subnet_uid: int, user_id: int) -> bool:
+    """Remove all of a user's price and condition alerts for a subnet"""
+    if not unindex_user_alerts(subnet_uid, user_id):
+        return False
+    if alert_store is not None:
+        alert_store.remove_user_alerts(subnet_uid, user_id)
+    else:
+        journal_append({'op': 'remove', 'subnet': subnet_uid, 'user_id': user_id})
+    if shard_hub is not None:
+        shard_hub.publish(subnet_uid, {'type': 'remove', 'subnet': subnet_uid, 'user_id': user_id})
+    return True
+
+def load_alerts():
+    """Load alerts from the configured store"""
+    if ALERT_STORE == 'sqlite':
+        load_sqlite_alerts()
+    else:
+        load_json_alerts()
+
+def load_sqlite_alerts():
+    """Load active alerts from SQLite, migrating the JSON files on first use"""
+    global alert_history, history_rollups, alert_store
+    try:
+        if alert_store is None:
+            alert_store = SQLiteAlertStore(SQLITE_FILE)
+        if not alert_store.is_migrated():
+            load_json_alerts()
+            alert_store.migrate(price_alerts_snapshot(), history_snapshot(), condition_alerts.to_dicts(), history_rollups)
+            logger.info(f"Migrated alerts and history from {ALERTS_FILE} and {HISTORY_FILE} to {SQLITE_FILE}")
+        # History stays on disk and is paged in by the commands that need it
+        load_price_alerts(alert_store.load_alerts())
+        alert_history = {}
+        history_rollups = {}
+        condition_alerts.load(alert_store.load_conditions())
+        logger.info(f"Loaded {count_price_alerts()} alerts for {len(alert_index)} subnets from {SQLITE_FILE}")
+    except Exception as e:
+        logger.error(f"Error loading alerts from {SQLITE_FILE}: {e}")
+        load_price_alerts({})
+        alert_history = {}
+
+def load_json_alerts():
+    """Load alerts, history and rollups from the file snapshot, then replay the journal.
+    
+    Reads the binary snapshot (STATE_SNAPSHOT_FILE), the default, or the JSON files written with
+    SNAPSHOT_FORMAT=json or by older versions, whichever is newer.
+    """
+    global alert_history, history_rollups
+    load_price_alerts({})
+    alert_history = {}
+    history_rollups = {}
+    condition_alerts.load([])
+    try:
+        # Complete a snapshot interrupted between renames
+        finish_snapshot()
+        # Load the newest snapshot: the binary state file, or the JSON files
+        if os.path.exists(STATE_SNAPSHOT_FILE) and (
+                not os.path.exists(ALERTS_FILE)
+                or os.path.getmtime(STATE_SNAPSHOT_FILE) >= os.path.getmtime(ALERTS_FILE)):
+            load_binary_snapshot()
+            logger.info(
+                f"Loaded {count_price_alerts()} alerts, {sum(len(log) for log in alert_history.values())} history "
+                f"entries and {len(condition_alerts)} condition alerts from {STATE_SNAPSHOT_FILE}"
+            )
+        else:
+            # Load price alerts
+            if os.path.exists(ALERTS_FILE):
+                with open(ALERTS_FILE, 'r') as f:
+                    data = json.load(f)
+                    price_alerts = {}
+                    for subnet_id, alerts in data.items():
+                        price_alerts[int(subnet_id)] = {}
+                        for user_id, user_alerts in alerts.items():
+                            price_alerts[int(subnet_id)][int(user_id)] = []
+                            if isinstance(user_alerts, list):
+                                for alert in user_alerts:
+                                    price_alerts[int(subnet_id)][int(user_id)].append({
+                                        'target_price': float(alert['target_price']),
+                                        'initial_price': float(alert['initial_price']),
+                                        **({'notify': alert['notify']} if alert.get('notify') else {})
+                                    })
+                            else:
+                                # Handle old format
+                                price_alerts[int(subnet_id)][int(user_id)].append({
+                                    'target_price': float(user_alerts),
+                                    'initial_price': float(user_alerts)
+                                })
+                load_price_alerts(price_alerts)
+                del data, price_alerts
+                logger.info(f"Loaded {count_price_alerts()} alerts for {len(alert_index)} subnets from {ALERTS_FILE}")
+            else:
+                logger.info(f"No existing alerts file found at {ALERTS_FILE}")
+            
+            # Load alert history
+            if os.path.exists(HISTORY_FILE):
+                with open(HISTORY_FILE, 'r') as f:
+                    data = json.load(f)
+                    for subnet_id, history in data.items():
+                        for alert in history:
+                            append_history(int(subnet_id), alert)
+                del data
+                logger.info(f"Loaded {sum(len(log) for log in alert_history.values())} history entries from {HISTORY_FILE}")
+            else:
+                logger.info(f"No existing history file found at {HISTORY_FILE}")
+            
+            # Load condition alerts
+            if os.path.exists(CONDITIONS_FILE):
+                with open(CONDITIONS_FILE, 'r') as f:
+                    data = json.load(f)
+                condition_alerts.load(data)
+                logger.info(f"Loaded {len(condition_alerts)} condition alerts from {CONDITIONS_FILE}")
+            
+            # Load history rollups
+            if os.path.exists(ROLLUPS_FILE):
+                with open(ROLLUPS_FILE, 'r') as f:
+                    merge_rollups(history_rollups, json.load(f))
+            
+        # Apply changes made since the last snapshot
+        replay_journal()
+        expire_rollups()
+    except Exception as e:
+        logger.error(f"Error loading alerts/history: {e}")
+        load_price_alerts({})
+        alert_history = {}
+        history_rollups = {}
+        condition_alerts.load([])
+
+def load_binary_snapshot():
+    """Load alerts, history, condition alerts and rollups from STATE_SNAPSHOT_FILE"""
+    with open(STATE_SNAPSHOT_FILE, 'rb') as f:
+        data = memoryview(f.read())
+    if bytes(data[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+        raise ValueError(f"{STATE_SNAPSHOT_FILE} is not an alert snapshot")
+    (header_size,) = struct.unpack_from('<Q', data, len(SNAPSHOT_MAGIC))
+    offset = len(SNAPSHOT_MAGIC) + 8 + header_size
+    header = json.loads(bytes(data[offset - header_size:offset]))
+    if header['byteorder'] != sys.byteorder:
+        raise ValueError(f"{STATE_SNAPSHOT_FILE} was written on a {header['byteorder']}-endian machine")
+    # Direction and notification target codes are assigned per process, so map the snapshot's codes onto ours
+    directions = np.array([direction_code(direction) for direction in header['directions']], dtype=np.int32)
+    target_sets = np.array([notify_code(targets) for targets in header.get('notify_target_sets', [[]])], dtype=np.int32)
+    
+    def remap(column: array, codes: np.ndarray):
+        if len(column) and not np.array_equal(codes, np.arange(len(codes))):
+            values = codes[np.frombuffer(column, dtype=np.int32)]
+            del column[:]
+            column.frombytes(values.tobytes())
+    
+    for kind, subnet_uid, lengths in header['sections']:
+        columnar = AlertIndex() if kind == 'alerts' else AlertHistoryLog()
+        if kind == 'alerts' and len(lengths) == 6:
+            # Written before alerts had notification targets: no notify columns
+            lengths = lengths[:3] + [0] + lengths[3:] + [0]
+        for column, length in zip(columnar.columns, lengths):
+            end = offset + length * column.itemsize
+            column.frombytes(data[offset:end])
+            offset = end
+        if kind == 'alerts':
+            for side in (columnar.rising, columnar.falling):
+                if len(side[3]) < len(side[0]):
+                    side[3].extend([0] * len(side[0]))
+                remap(side[3], target_sets)
+            columnar.drop_non_finite()
+            alert_index[subnet_uid] = columnar
+        else:
+            remap(columnar.directions, directions)
+            alert_history[subnet_uid] = columnar
+    condition_alerts.load(header['conditions'])
+    merge_rollups(history_rollups, header['rollups'])
+
+def binary_snapshot() -> List[bytes]:
+    """All state as SNAPSHOT_MAGIC, a length-prefixed JSON header, then the raw bytes of every column"""
+    sections = []
+    chunks = []
+    for kind, objects in (('alerts', alert_index), ('history', alert_history)):
+        for subnet_uid, columnar in objects.items():
+            sections.append([kind, subnet_uid, [len(column) for column in columnar.columns]])
+            chunks.extend(column.tobytes() for column in columnar.columns)
+    header = json.dumps({
+        'byteorder': sys.byteorder,
+        'directions': DIRECTIONS,
+        'notify_target_sets': NOTIFY_TARGET_SETS,
+        'sections': sections,
+        'conditions': condition_alerts.to_dicts(),
+        'rollups': history_rollups
+    }).encode()
+    return [SNAPSHOT_MAGIC, struct.pack('<Q', len(header)), header] + chunks
+
+def snapshot_files() -> List[Tuple[str, object]]:
+    """Serialize all state as (path, data) pairs in SNAPSHOT_FORMAT; str data is text, a list of bytes is binary"""
+    if SNAPSHOT_FORMAT == 'binary':
+        return [(STATE_SNAPSHOT_FILE, binary_snapshot())]
+    return [
+        (HISTORY_FILE, json.dumps(history_snapshot())),
+        (ROLLUPS_FILE, json.dumps(history_rollups)),
+        (CONDITIONS_FILE, json.dumps(condition_alerts.to_dicts())),
+        (ALERTS_FILE, json.dumps(price_alerts_snapshot()))
+    ]
+
+journal_file = None
+journal_entries = 0
+journal_sync_pending = False
+compaction_task: Optional[asyncio.Task] = None
+
+def apply_journal_entry(entry: Dict):
+    """Apply one journal entry to the alert index, condition_alerts and alert_history"""
+    subnet_uid = int(entry['subnet'])
+    op = entry['op']
+    if op == 'add':
+        index_alert(subnet_uid, int(entry['user_id']), {
+            'target_price': float(entry['target_price']),
+            'initial_price': float(entry['initial_price']),
+            **({'notify': entry['notify']} if entry.get('notify') else {})
+        })
+    elif op == 'condition_add':
+        condition_alerts.add(entry['alert'])
+    elif op == 'condition_trigger':
+        condition_alerts.remove_ids([entry['id']])
+        append_history(subnet_uid, entry['entry'])
+    elif op == 'remove':
+        unindex_user_alerts(subnet_uid, int(entry['user_id']))
+    elif op == 'history_prune':
+        prune_history_log(subnet_uid, int(entry['count']), entry['rollups'])
+    elif op in ('trigger', 'history'):
+        history_entry = entry['entry']
+        if op == 'trigger':
+            unindex_alert(subnet_uid, int(history_entry['user_id']), {
+                'target_price': float(history_entry['target_price']),
+                'initial_price': float(history_entry['initial_price'])
+            })
+        append_history(subnet_uid, history_entry)
+
+def replay_journal():
+    """Replay journal entries written after the last snapshot, including an interrupted compaction"""
+    global journal_entries
+    sync_journal()
+    replayed = 0
+    for path in (JOURNAL_COMPACTING_FILE, JOURNAL_FILE):
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; everything before it is intact
+                    logger.warning(f"Skipping incomplete journal entry in {path}")
+                    continue
+                apply_journal_entry(entry)
+                replayed += 1
+    journal_entries = replayed
+    logger.info(f"Replayed {replayed} journal entries")
+
+def journal_append(entry: Dict):
+    """Append an entry to the journal; fsync is batched every JOURNAL_FSYNC_INTERVAL seconds"""
+    global journal_file, journal_entries, journal_sync_pending
+    try:
+        if journal_file is None:
+            journal_file = open(JOURNAL_FILE, 'a')
+        journal_file.write(json.dumps(entry) + '\n')
+        journal_entries += 1
+        if not journal_sync_pending:
+            journal_sync_pending = True
+            asyncio.get_running_loop().call_later(JOURNAL_FSYNC_INTERVAL, sync_journal)
+    except Exception as e:
+        logger.error(f"Error writing alert journal: {e}")
+
+def sync_journal():
+    """Flush and fsync buffered journal entries"""
+    global journal_sync_pending
+    journal_sync_pending = False
+    try:
+        if journal_file is not None:
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+    except Exception as e:
+        logger.error(f"Error syncing alert journal: {e}")
+
+def rotate_journal():
+    """Move the current journal aside so a snapshot can replace it"""
+    global journal_file, journal_entries
+    sync_journal()
+    if journal_file is not None:
+        journal_file.close()
+        journal_file = None
+    journal_entries = 0
+    if not os.path.exists(JOURNAL_FILE):
+        return
+    if os.path.exists(JOURNAL_COMPACTING_FILE):
+        # A previous compaction failed; keep its entries and append ours after them
+        with open(JOURNAL_FILE, 'r') as src, open(JOURNAL_COMPACTING_FILE, 'a') as dst:
+            dst.write(src.read())
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.remove(JOURNAL_FILE)
+    else:
+        os.replace(JOURNAL_FILE, JOURNAL_COMPACTING_FILE)
+
+def write_file_synced(path: str, data):
+    """Write text, or a list of byte strings, and fsync it"""
+    binary = not isinstance(data, str)
+    with open(path, 'wb' if binary else 'w') as f:
+        if binary:
+            f.writelines(data)
+        else:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+def write_file_atomic(path: str, data):
+    """Write via a temporary file and rename so a crash never leaves it half written"""
+    write_file_synced(f"{path}.tmp", data)
+    os.replace(f"{path}.tmp", path)
+
+def write_snapshot(files: List[Tuple[str, object]]):
+    """Write serialized alerts and history as one unit, then drop the journal entries they cover.
+    
+    Every file is written in full under a temporary name before the commit file listing them is created,
+    and only then renamed into place; finish_snapshot redoes the renames after a crash. So the snapshot
+    files always come from the same snapshot, and the journal is never replayed on top of part of one.
+    """
+    for path, data in files:
+        write_file_synced(f"{path}.tmp", data)
+    write_file_atomic(SNAPSHOT_COMMIT_FILE, json.dumps([path for path, _ in files]))
+    finish_snapshot()
+
+def finish_snapshot():
+    """Move a committed snapshot's files into place and drop the journal entries it covers"""
+    if not os.path.exists(SNAPSHOT_COMMIT_FILE):
+        return
+    with open(SNAPSHOT_COMMIT_FILE, 'r') as f:
+        paths = json.load(f)
+    for path in paths:
+        if os.path.exists(f"{path}.tmp"):
+            os.replace(f"{path}.tmp", path)
+    if STATE_SNAPSHOT_FILE not in paths and os.path.exists(STATE_SNAPSHOT_FILE):
+        # The JSON files are newer now; a leftover binary snapshot would only be confusing
+        os.remove(STATE_SNAPSHOT_FILE)
+    if os.path.exists(JOURNAL_COMPACTING_FILE):
+        os.remove(JOURNAL_COMPACTING_FILE)
+    os.remove(SNAPSHOT_COMMIT_FILE)
+
+def save_alerts():
+    """Save a full snapshot of alerts and history in SNAPSHOT_FORMAT: the binary state file by default,
+    or the JSON files"""
+    try:
+        with SAVE_DURATION.time(kind='save'):
+            rotate_journal()
+            write_snapshot(snapshot_files())
+        logger.info(f"Saved {count_price_alerts()} alerts and alert history ({SNAPSHOT_FORMAT} snapshot)")
+    except Exception as e:
+        logger.error(f"Error saving alerts/history: {e}")
+
+async def compact_alerts():
+    """Fold the journal into a fresh snapshot, writing it on a background thread"""
+    try:
+        rotate_journal()
+        # Serialize on the event loop so the snapshot matches the rotated journal exactly
+        files = snapshot_files()
+        with SAVE_DURATION.time(kind='compact'):
+            await asyncio.to_thread(write_snapshot, files)
+        logger.info(f"Compacted alert journal into a {SNAPSHOT_FORMAT} snapshot")
+    except Exception as e:
+        logger.error(f"Error compacting alerts/history: {e}")
+
+def maybe_compact_alerts():
+    """Start a background compaction once the journal has grown past JOURNAL_COMPACT_ENTRIES"""
+    global compaction_task
+    if journal_entries < JOURNAL_COMPACT_ENTRIES:
+        return
+    if compaction_task is not None and not compaction_task.done():
+        return
+    compaction_task = asyncio.create_task(compact_alerts())
+
+class SQLiteAlertStore:
+    """Alerts and history in a SQLite database, indexed for per-user and per-subnet lookups"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Opened on the startup thread that loads state, then used from the event loop
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY,
+                subnet_uid INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                target_price REAL NOT NULL,
+                initial_price REAL NOT NULL,
+                notify TEXT
+            );
+            CREATE INDEX IF NOT EXISTS alerts_user ON alerts (user_id, subnet_uid);
+            CREATE INDEX IF NOT EXISTS alerts_subnet ON alerts (subnet_uid);
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                subnet_uid INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                target_price REAL NOT NULL,
+                initial_price REAL NOT NULL,
+                triggered_price REAL NOT NULL,
+                direction TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_subnet ON history (subnet_uid, timestamp);
+            CREATE INDEX IF NOT EXISTS history_user ON history (user_id, timestamp);
+            CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+            CREATE TABLE IF NOT EXISTS condition_alerts (
+                id INTEGER PRIMARY KEY,
+                subnet_uid INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                window REAL NOT NULL,
+                notify TEXT
+            );
+            CREATE INDEX IF NOT EXISTS condition_alerts_user ON condition_alerts (user_id, subnet_uid);
+            CREATE TABLE IF NOT EXISTS history_rollups (
+                subnet_uid INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                triggers INTEGER NOT NULL,
+                low_price REAL NOT NULL,
+                high_price REAL NOT NULL,
+                PRIMARY KEY (subnet_uid, day)
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        # Databases created before alerts had notification targets
+        for table in ('alerts', 'condition_alerts'):
+            if 'notify' not in [row['name'] for row in self.conn.execute(f"PRAGMA table_info({table})")]:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN notify TEXT")
+        self.conn.commit()
+
+    @staticmethod
+    def _notify_column(alert: Dict) -> Optional[str]:
+        return ','.join(alert['notify']) if alert.get('notify') else None
+
+    @staticmethod
+    def _alert(row) -> Dict:
+        alert = {'target_price': row['target_price'], 'initial_price': row['initial_price']}
+        if row['notify']:
+            alert['notify'] = row['notify'].split(',')
+        return alert
+
+    def is_migrated(self) -> bool:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+        return row is not None
+
+    def migrate(self, alerts: Dict[int, Dict[int, List[Dict]]], history: Dict[int, List[Dict]], conditions: List[Dict],
+                rollups: Dict[int, Dict[str, List]]):
+        """Import alerts and history loaded from the JSON files, once"""
+        with self.conn:
+            self.merge_rollups(rollups)
+            self.conn.executemany(
+                "INSERT INTO condition_alerts (id, subnet_uid, user_id, type, threshold, window, notify) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(alert['id'], alert['subnet'], alert['user_id'], alert['type'], alert['threshold'], alert['window'],
+                  self._notify_column(alert))
+                 for alert in conditions]
+            )
+            self.conn.executemany(
+                "INSERT INTO alerts (subnet_uid, user_id, target_price, initial_price, notify) VALUES (?, ?, ?, ?, ?)",
+                [(subnet_uid, user_id, alert['target_price'], alert['initial_price'], self._notify_column(alert))
+                 for subnet_uid, subnet_alerts in alerts.items()
+                 for user_id, user_alerts in subnet_alerts.items()
+                 for alert in user_alerts]
+            )
+            self.conn.executemany(
+                "INSERT INTO history (subnet_uid, user_id, target_price, initial_price, triggered_price, direction, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(subnet_uid, entry['user_id'], entry['target_price'], entry['initial_price'],
+                  entry['triggered_price'], entry['direction'], entry['timestamp'])
+                 for subnet_uid, entries in history.items()
+                 for entry in entries]
+            )
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', ?)", (datetime.now().isoformat(),))
+
+    def load_alerts(self) -> Dict[int, Dict[int, List[Dict]]]:
+        """Load all active alerts (history stays on disk)"""
+        alerts: Dict[int, Dict[int, List[Dict]]] = {}
+        for row in self.conn.execute(
+            "SELECT subnet_uid, user_id, target_price, initial_price, notify FROM alerts ORDER BY id"
+        ):
+            alerts.setdefault(row['subnet_uid'], {}).setdefault(row['user_id'], []).append(self._alert(row))
+        return alerts
+
+    def load_conditions(self) -> List[Dict]:
+        return [{
+            'id': row['id'],
+            'subnet': row['subnet_uid'],
+            'user_id': row['user_id'],
+            'type': row['type'],
+            'threshold': row['threshold'],
+            'window': row['window'],
+            **({'notify': row['notify'].split(',')} if row['notify'] else {})
+        } for row in self.conn.execute("SELECT * FROM condition_alerts ORDER BY id")]
+
+    def add_condition(self, alert: Dict):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO condition_alerts (id, subnet_uid, user_id, type, threshold, window, notify) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (alert['id'], alert['subnet'], alert['user_id'], alert['type'], alert['threshold'], alert['window'],
+                 self._notify_column(alert))
+            )
+
+    def add_alert(self, subnet_uid: int, user_id: int, alert: Dict):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO alerts (subnet_uid, user_id, target_price, initial_price, notify) VALUES (?, ?, ?, ?, ?)",
+                (subnet_uid, user_id, alert['target_price'], alert['initial_price'], self._notify_column(alert))
+            )
+
+    def remove_user_alerts(self, subnet_uid: int, user_id: int):
+        with self.conn:
+            self.conn.execute("DELETE FROM alerts WHERE subnet_uid = ? AND user_id = ?", (subnet_uid, user_id))
+            self.conn.execute("DELETE FROM condition_alerts WHERE subnet_uid = ? AND user_id = ?", (subnet_uid, user_id))
+
+    def record_history(self, subnet_uid: int, entry: Dict, remove_alert: bool = False, condition_id: Optional[int] = None):
+        """Add a history entry, optionally removing the price or condition alert it was triggered by"""
+        with self.conn:
+            if condition_id is not None:
+                self.conn.execute("DELETE FROM condition_alerts WHERE id = ?", (condition_id,))
+            if remove_alert:
+                self.conn.execute(
+                    "DELETE FROM alerts WHERE id = (SELECT id FROM alerts WHERE subnet_uid = ? AND user_id = ? "
+                    "AND target_price = ? AND initial_price = ? LIMIT 1)",
+                    (subnet_uid, entry['user_id'], entry['target_price'], entry['initial_price'])
+                )
+            self.conn.execute(
+                "INSERT INTO history (subnet_uid, user_id, target_price, initial_price, triggered_price, direction, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (subnet_uid, entry['user_id'], entry['target_price'], entry['initial_price'],
+                 entry['triggered_price'], entry['direction'], entry['timestamp'])
+            )
+
+    def user_alerts(self, user_id: int) -> Dict[int, List[Dict]]:
+        """Get a user's active alerts grouped by subnet"""
+        alerts: Dict[int, List[Dict]] = {}
+        for row in self.conn.execute(
+            "SELECT subnet_uid, target_price, initial_price, notify FROM alerts WHERE user_id = ? ORDER BY subnet_uid, id",
+            (user_id,)
+        ):
+            alerts.setdefault(row['subnet_uid'], []).append(self._alert(row))
+        return alerts
+
+    def merge_rollups(self, rollups: Dict[int, Dict[str, List]], conn: Optional[sqlite3.Connection] = None):
+        (conn or self.conn).executemany(
+            "INSERT INTO history_rollups (subnet_uid, day, triggers, low_price, high_price) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (subnet_uid, day) DO UPDATE SET triggers = triggers + excluded.triggers, "
+            "low_price = MIN(low_price, excluded.low_price), high_price = MAX(high_price, excluded.high_price)",
+            [(subnet_uid, day, count, low, high)
+             for subnet_uid, days in rollups.items()
+             for day, (count, low, high) in days.items()]
+        )
+
+    def prune_history(self, cutoff: Optional[str], max_entries: int, rollup_cutoff: Optional[str], archive) -> int:
+        """Fold history older than the cutoff or beyond the newest max_entries of its subnet into rollups.
+        
+        Walks the table in id ranges of HISTORY_PRUNE_BATCH on a connection of its own, so it can run in a
+        worker thread; each range's expired rows are passed to archive([(subnet_uid, entry), ...]), then
+        replaced by their rollups in one short transaction. Returns the number of rows pruned.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conditions = []
+            params: list = []
+            if cutoff is not None:
+                conditions.append("timestamp < ?")
+                params.append(cutoff)
+            if max_entries:
+                # Newest expired row of each subnet over the limit; it and everything older goes
+                conn.execute("CREATE TEMP TABLE prune_bounds (subnet_uid INTEGER PRIMARY KEY, timestamp TEXT, id INTEGER)")
+                for row in conn.execute("SELECT subnet_uid, COUNT(*) AS entries FROM history GROUP BY subnet_uid").fetchall():
+                    if row['entries'] > max_entries:
+                        conn.execute(
+                            "INSERT INTO prune_bounds SELECT subnet_uid, timestamp, id FROM history WHERE subnet_uid = ? "
+                            "ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?",
+                            (row['subnet_uid'], max_entries)
+                        )
+                conditions.append(
+                    "EXISTS (SELECT 1 FROM prune_bounds AS bound WHERE bound.subnet_uid = history.subnet_uid AND "
+                    "(history.timestamp < bound.timestamp OR (history.timestamp = bound.timestamp AND history.id <= bound.id)))"
+                )
+            pruned = 0
+            if conditions:
+                first_id, last_id = conn.execute("SELECT MIN(id), MAX(id) FROM history").fetchone()
+                for batch_start in range(first_id or 0, (last_id or -1) + 1, HISTORY_PRUNE_BATCH):
+                    rows = conn.execute(
+                        f"SELECT * FROM history WHERE id >= ? AND id < ? AND ({' OR '.join(conditions)})",
+                        [batch_start, batch_start + HISTORY_PRUNE_BATCH] + params
+                    ).fetchall()
+                    if not rows:
+                        continue
+                    entries = [(row['subnet_uid'], {
+                        'user_id': row['user_id'],
+                        'target_price': row['target_price'],
+                        'initial_price': row['initial_price'],
+                        'triggered_price': row['triggered_price'],
+                        'direction': row['direction'],
+                        'timestamp': row['timestamp']
+                    }) for row in rows]
+                    # Archive before deleting: a crash in between can repeat archive lines but never lose them
+                    archive(entries)
+                    with conn:
+                        self.merge_rollups(rollup_entries(entries), conn)
+                        conn.executemany("DELETE FROM history WHERE id = ?", [(row['id'],) for row in rows])
+                    pruned += len(rows)
+            if rollup_cutoff is not None:
+                with conn:
+                    conn.execute("DELETE FROM history_rollups WHERE day < ?", (rollup_cutoff,))
+            return pruned
+        finally:
+            conn.close()
+
+    def history_summary(self, subnet_uid: Optional[int], since_day: str) -> Dict[int, Dict[str, List]]:
+        """Daily rollups plus raw history summarized the same way, from since_day on"""
+        subnet_filter = "AND subnet_uid = ?" if subnet_uid is not None else ""
+        params = (since_day, subnet_uid) if subnet_uid is not None else (since_day,)
+        summary: Dict[int, Dict[str, List]] = {}
+        for query in (
+            f"SELECT subnet_uid, day, triggers, low_price, high_price FROM history_rollups "
+            f"WHERE day >= ? {subnet_filter}",
+            f"SELECT subnet_uid, substr(timestamp, 1, 10) AS day, COUNT(*) AS triggers, "
+            f"MIN(triggered_price) AS low_price, MAX(triggered_price) AS high_price FROM history "
+            f"WHERE timestamp >= ? {subnet_filter} GROUP BY subnet_uid, day"
+        ):
+            for row in self.conn.execute(query, params):
+                merge_rollups(summary, {row['subnet_uid']: {row['day']: [row['triggers'], row['low_price'], row['high_price']]}})
+        return summary
+
+    def has_history(self, subnet_uid: Optional[int] = None) -> bool:
+        if subnet_uid is None:
+            row = self.conn.execute("SELECT 1 FROM history LIMIT 1").fetchone()
+        else:
+            row = self.conn.execute("SELECT 1 FROM history WHERE subnet_uid = ? LIMIT 1", (subnet_uid,)).fetchone()
+        return row is not None
+
+    def iter_history(self, subnet_uid: Optional[int] = None, user_id: Optional[int] = None,
+                     since: Optional[str] = None, until: Optional[str] = None,
+                     offset: int = 0, limit: Optional[int] = None):
+        """Yield (subnet_uid, entry) from disk a page at a time, ordered by subnet and time"""
+        conditions = []
+        params: list = []
+        if subnet_uid is not None:
+            conditions.append("subnet_uid = ?")
+            params.append(subnet_uid)
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.conn.execute(
+            f"SELECT * FROM history {where} ORDER BY subnet_uid, timestamp, id LIMIT ? OFFSET ?",
+            (*params, -1 if limit is None else limit, offset)
+        )
+        while True:
+            rows = cursor.fetchmany(HISTORY_PAGE_ROWS)
+            if not rows:
+                return
+            for row in rows:
+                yield row['subnet_uid'], {
+                    'user_id': row['user_id'],
+                    'target_price': row['target_price'],
+                    'initial_price': row['initial_price'],
+                    'triggered_price': row['triggered_price'],
+                    'direction': row['direction'],
+                    'timestamp': row['timestamp']
+                }
+
+alert_store: Optional[SQLiteAlertStore] = None
+
+def get_user_alerts(user_id: int) -> Dict[int, List[Dict]]:
+    """Get a user's active alerts grouped by subnet"""
+    if alert_store is not None:
+        return alert_store.user_alerts(user_id)
+    user_alerts = {}
+    for subnet_uid, index in sorted(alert_index.items()):
+        alerts = index.user_alerts(user_id)
+        if alerts:
+            user_alerts[subnet_uid] = alerts
+    return user_alerts
+
+def has_alert_history(subnet_uid: Optional[int] = None) -> bool:
+    """Check whether any history exists, optionally for one subnet"""
+    if alert_store is not None:
+        return alert_store.has_history(subnet_uid)
+    if subnet_uid is None:
+        return any(len(log) for log in alert_history.values())
+    return subnet_uid in alert_history and len(alert_history[subnet_uid]) > 0
+
+def iter_alert_history(subnet_uid: Optional[int] = None, user_id: Optional[int] = None,
+                       since: Optional[str] = None, until: Optional[str] = None,
+                       offset: int = 0, limit: Optional[int] = None):
+    """Yield (subnet_uid, entry) for all history, or one subnet's history, matching the filters"""
+    if alert_store is not None:
+        yield from alert_store.iter_history(subnet_uid, user_id, since, until, offset, limit)
+        return
+    subnet_ids = [subnet_uid] if subnet_uid is not None else list(alert_history)
+    since_seconds = epoch_seconds(since) if since is not None else None
+    until_seconds = epoch_seconds(until) if until is not None else None
+    for subnet_id in subnet_ids:
+        log = alert_history.get(subnet_id)
+        if log is None:
+            continue
+        positions = log.matching(user_id, since_seconds, until_seconds)
+        # Skip whole subnets until the offset is used up, without building their entries
+        if offset >= len(positions):
+            offset -= len(positions)
+            continue
+        positions = positions[offset:]
+        offset = 0
+        if limit is not None:
+            positions = positions[:limit]
+            limit -= len(positions)
+        for position in positions.tolist():
+            yield subnet_id, log.entry(position)
+        if limit == 0:
+            return
+
+def history_summary(subnet_uid: Optional[int], days: int) -> Dict[int, Dict[str, List]]:
+    """Daily [triggers, low price, high price] per subnet over the last `days` days, from rollups and raw history"""
+    since_day = (datetime.now() - timedelta(days=days)).date().isoformat()
+    if alert_store is not None:
+        return alert_store.history_summary(subnet_uid, since_day)
+    summary: Dict[int, Dict[str, List]] = {}
+    for subnet_id, days_rollups in history_rollups.items():
+        if subnet_uid is None or subnet_id == subnet_uid:
+            merge_rollups(summary, {subnet_id: {day: rollup for day, rollup in days_rollups.items() if day >= since_day}})
+    merge_rollups(summary, rollup_entries(iter_alert_history(subnet_uid, since=since_day)))
+    return {subnet_id: days_rollups for subnet_id, days_rollups in summary.items() if days_rollups}
+
+def write_history_archive(entries: List[Tuple[int, Dict]]):
+    """Append pruned history to one gzip JSON-lines file per day, keeping the newest HISTORY_ARCHIVE_DAYS files"""
+    if not HISTORY_ARCHIVE_DAYS or not entries:
+        return
+    os.makedirs(HISTORY_ARCHIVE_DIR, exist_ok=True)
+    by_day: Dict[str, List[str]] = {}
+    for subnet_uid, entry in entries:
+        by_day.setdefault(entry['timestamp'][:10], []).append(json.dumps({'subnet': subnet_uid, **entry}))
+    for day, lines in by_day.items():
+        with gzip.open(os.path.join(HISTORY_ARCHIVE_DIR, f"history-{day}.jsonl.gz"), 'at') as f:
+            f.write('\n'.join(lines) + '\n')
+    archives = sorted(name for name in os.listdir(HISTORY_ARCHIVE_DIR)
+                      if name.startswith('history-') and name.endswith('.jsonl.gz'))
+    for name in archives[:-HISTORY_ARCHIVE_DAYS]:
+        os.remove(os.path.join(HISTORY_ARCHIVE_DIR, name))
+
+async def prune_history():
+    """Fold history past its retention into daily rollups, archiving the raw entries first"""
+    try:
+        cutoff = datetime.now() - timedelta(days=HISTORY_RETENTION_DAYS) if HISTORY_RETENTION_DAYS else None
+        with SAVE_DURATION.time(kind='prune'):
+            if alert_store is not None:
+                pruned = await asyncio.to_thread(
+                    alert_store.prune_history, cutoff.isoformat() if cutoff else None, HISTORY_MAX_ENTRIES,
+                    rollup_cutoff_day(), write_history_archive
+                )
+            else:
+                cutoff_seconds = cutoff.timestamp() if cutoff else None
+                expired_counts = {subnet_uid: log.expired_count(cutoff_seconds, HISTORY_MAX_ENTRIES)
+                                  for subnet_uid, log in alert_history.items()}
+                pruned = 0
+                for subnet_uid, count in expired_counts.items():
+                    while count:
+                        # Triggers recorded while the archive is written only append, so the oldest entries stay put
+                        batch = min(count, HISTORY_PRUNE_BATCH)
+                        log = alert_history[subnet_uid]
+                        entries = [(subnet_uid, log.entry(position)) for position in range(batch)]
+                        await asyncio.to_thread(write_history_archive, entries)
+                        rollups = rollup_entries(entries)[subnet_uid]
+                        prune_history_log(subnet_uid, batch, rollups)
+                        journal_append({'op': 'history_prune', 'subnet': subnet_uid, 'count': batch, 'rollups': rollups})
+                        count -= batch
+                        pruned += batch
+                expire_rollups()
+                maybe_compact_alerts()
+        if pruned:
+            logger.info(f"Pruned {pruned} history entries into daily rollups")
+    except Exception as e:
+        logger.error(f"Error pruning alert history: {e}")
+
+class PriceCache:
+    """Per-subnet (price, name, block) cache with a TTL, serving stale entries while they refresh"""
+
+    def __init__(self, ttl: float, max_stale: float):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        # {subnet_uid: ((price, subnet_name, block) or None if the subnet does not exist, fetched_at)}
+        self.entries: Dict[int, Tuple[Optional[Tuple[float, str, int]], float]] = {}
+        self.in_flight: Dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def seed(self, snapshot: Dict[int, Tuple[float, str, int]]):
+        """Store a bulk snapshot, keeping any entry that is already from a newer block"""
+        now = time.monotonic()
+        for subnet_uid, value in snapshot.items():
+            cached = self.entries.get(subnet_uid)
+            if cached is None or cached[0] is None or cached[0][2] <= value[2]:
+                self.entries[subnet_uid] = (value, now)
+
+    async def get(self, subnet_uid: int) -> Optional[Tuple[float, str, int]]:
+        cached = self.entries.get(subnet_uid)
+        if cached is not None:
+            age = time.monotonic() - cached[1]
+            if age < self.ttl:
+                self.hits += 1
+                return cached[0]
+            if age < self.max_stale:
+                # Answer now from the stale entry and refresh it in the background
+                self.stale_hits += 1
+                self._refresh(subnet_uid)
+                return cached[0]
+        self.misses += 1
+        return await asyncio.shield(self._refresh(subnet_uid))
+
+    def _refresh(self, subnet_uid: int) -> asyncio.Task:
+        """Start (or join) the one in-flight fetch for this subnet"""
+        task = self.in_flight.get(subnet_uid)
+        if task is None:
+            task = asyncio.create_task(self._fetch(subnet_uid))
+            self.in_flight[subnet_uid] = task
+            task.add_done_callback(lambda done: self._refreshed(subnet_uid, done))
+        return task
+
+    def _refreshed(self, subnet_uid: int, task: asyncio.Task):
+        self.in_flight.pop(subnet_uid, None)
+        # Retrieve the error even when nobody awaited the task, as for background refreshes of stale entries
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Error refreshing price of subnet {subnet_uid}: {task.exception()}")
+
+    async def _fetch(self, subnet_uid: int) -> Optional[Tuple[float, str, int]]:
+        block = await chain.call('get_current_block')
+        subnet_info = await chain.call('subnet', subnet_uid, block)
+        value = (float(subnet_info.price), subnet_info.subnet_name, block) if subnet_info else None
+        cached = self.entries.get(subnet_uid)
+        if cached is None or cached[0] is None or value is None or cached[0][2] <= block:
+            self.entries[subnet_uid] = (value, time.monotonic())
+        return value
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses, 'subnets': len(self.entries)}
+
+price_cache = PriceCache(PRICE_CACHE_TTL, PRICE_CACHE_MAX_STALE)
+
+class PriceHistory:
+    """Fixed-size ring buffer of (block, timestamp, price) samples per subnet in a memory-mapped file,
+    or in anonymous memory when path is None"""
+
+    def __init__(self, path: Optional[str], subnets: int, samples: int):
+        self.path = path
+        self.subnets = subnets
+        self.samples = samples
+        header_bytes = subnets * 2 * 8
+        size = header_bytes + subnets * samples * 3 * 8
+        if path is None:
+            self.mm = mmap.mmap(-1, size)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT)
+            try:
+                if os.fstat(fd).st_size != size:
+                    # New file, or one written with a different layout; start empty
+                    logger.info(f"Creating price history file {path} ({size / 1024 / 1024:.1f} MiB)")
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                self.mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        # Per subnet: [next write position, number of samples]
+        self.positions = memoryview(self.mm)[:header_bytes].cast('q')
+        # Per subnet: samples * [block, timestamp, price]
+        self.data = memoryview(self.mm)[header_bytes:].cast('d')
+        self.last_flush = time.monotonic()
+
+    def record(self, subnet_uid: int, block: int, timestamp: float, price: float):
+        if not 0 <= subnet_uid < self.subnets:
+            return
+        head = self.positions[2 * subnet_uid]
+        count = self.positions[2 * subnet_uid + 1]
+        if count and self.sample(subnet_uid, 0)[0] == block:
+            return
+        base = (subnet_uid * self.samples + head) * 3
+        self.data[base] = float(block)
+        self.data[base + 1] = timestamp
+        self.data[base + 2] = price
+        self.positions[2 * subnet_uid] = (head + 1) % self.samples
+        self.positions[2 * subnet_uid + 1] = min(count + 1, self.samples)
+
+    def sample(self, subnet_uid: int, age: int) -> Tuple[int, float, float]:
+        """The sample recorded `age` samples ago (0 is the newest)"""
+        position = (self.positions[2 * subnet_uid] - 1 - age) % self.samples
+        base = (subnet_uid * self.samples + position) * 3
+        return int(self.data[base]), self.data[base + 1], self.data[base + 2]
+
+    def window(self, subnet_uid: int, seconds: float) -> List[Tuple[int, float, float]]:
+        """Samples from the last `seconds`, oldest first"""
+        if not 0 <= subnet_uid < self.subnets:
+            return []
+        cutoff = time.time() - seconds
+        samples = []
+        for age in range(self.positions[2 * subnet_uid + 1]):
+            sample = self.sample(subnet_uid, age)
+            if sample[1] < cutoff:
+                break
+            samples.append(sample)
+        samples.reverse()
+        return samples
+
+    def price_before(self, subnet_uid: int, seconds: float) -> Optional[Tuple[int, float, float]]:
+        """The newest sample at least `seconds` old, or the oldest one we have"""
+        if not 0 <= subnet_uid < self.subnets or not self.positions[2 * subnet_uid + 1]:
+            return None
+        cutoff = time.time() - seconds
+        count = self.positions[2 * subnet_uid + 1]
+        for age in range(count):
+            sample = self.sample(subnet_uid, age)
+            if sample[1] <= cutoff:
+                return sample
+        return self.sample(subnet_uid, count - 1)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """NumPy views of the sample counts (subnets,) and samples (subnets, samples, 3), without copying"""
+        counts = np.frombuffer(self.mm, dtype=np.int64, count=2 * self.subnets)[1::2]
+        data = np.frombuffer(self.mm, dtype=np.float64, offset=self.subnets * 2 * 8)
+        return counts, data.reshape(self.subnets, self.samples, 3)
+
+    def export(self, subnet_uid: int) -> np.ndarray:
+        """A copy of the subnet's samples as a (count, 3) array of block, timestamp and price, oldest first"""
+        if not 0 <= subnet_uid < self.subnets:
+            return np.empty((0, 3))
+        head, count = self.positions[2 * subnet_uid], self.positions[2 * subnet_uid + 1]
+        _, data = self.arrays()
+        return data[subnet_uid, np.arange(head - count, head) % self.samples]
+
+    def merge(self, subnet_uid: int, samples: np.ndarray):
+        """Add samples recorded elsewhere, such as the price fetcher's, keeping one sample per block in block order"""
+        if not 0 <= subnet_uid < self.subnets:
+            return
+        rows = np.concatenate([np.asarray(samples, dtype=np.float64).reshape(-1, 3), self.export(subnet_uid)])
+        # np.unique sorts by block and keeps the first row of each block, so fetched samples win over our own
+        _, first = np.unique(rows[:, 0], return_index=True)
+        rows = rows[first][-self.samples:]
+        _, data = self.arrays()
+        data[subnet_uid, :len(rows)] = rows
+        self.positions[2 * subnet_uid] = len(rows) % self.samples
+        self.positions[2 * subnet_uid + 1] = len(rows)
+
+    async def maybe_flush(self):
+        """Write dirty pages to disk every PRICE_HISTORY_FLUSH_INTERVAL seconds"""
+        if self.path is None or time.monotonic() - self.last_flush < PRICE_HISTORY_FLUSH_INTERVAL:
+            return
+        self.last_flush = time.monotonic()
+        await asyncio.to_thread(self.mm.flush)
+
+price_history: Optional[PriceHistory] = None
+
+def open_price_history():
+    """Open the price history file"""
+    global price_history
+    try:
+        price_history = PriceHistory(PRICE_HISTORY_FILE, PRICE_HISTORY_SUBNETS, PRICE_HISTORY_SAMPLES)
+    except Exception as e:
+        logger.error(f"Error opening price history {PRICE_HISTORY_FILE}: {e}")
+
+# Condition alert types: percent move within a window, moving-average cross, volatility above a threshold
+CONDITION_TYPES = ('pct', 'ma', 'vol')
+
+def format_window(seconds: float) -> str:
+    """Format seconds as the shortest window like 90s, 30m, 1h or 7d"""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{int(seconds // size)}{unit}"
+    return f"{seconds:g}s"
+
+class ConditionAlerts:
+    """Percent-move, moving-average-cross and volatility alerts, stored column-wise for vectorized evaluation"""
+
+    def __init__(self):
+        self.next_id = 1
+        self.load([])
+
+    def load(self, alerts: List[Dict]):
+        """Replace all alerts with the given {'id', 'subnet', 'user_id', 'type', 'threshold', 'window'} dicts,
+        plus 'notify' for alerts with their own notification targets"""
+        self.ids = np.array([alert['id'] for alert in alerts], dtype=np.int64)
+        self.subnets = np.array([alert['subnet'] for alert in alerts], dtype=np.int64)
+        self.user_ids = np.array([alert['user_id'] for alert in alerts], dtype=np.int64)
+        self.kinds = np.array([CONDITION_TYPES.index(alert['type']) for alert in alerts], dtype=np.int8)
+        self.thresholds = np.array([alert['threshold'] for alert in alerts], dtype=np.float64)
+        self.windows = np.array([alert['window'] for alert in alerts], dtype=np.float64)
+        self.notify = np.array([notify_code(alert.get('notify')) for alert in alerts], dtype=np.int32)
+        # Side of its moving average each 'ma' alert's subnet was on at the last evaluation (0 = unknown)
+        self.sides = np.zeros(len(alerts), dtype=np.int8)
+        self.next_id = max(self.next_id, int(self.ids.max()) + 1 if len(alerts) else 1)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, alert: Dict) -> Dict:
+        """Add an alert, assigning it an id if it has none"""
+        if 'id' not in alert:
+            alert = {'id': self.next_id, **alert}
+        self.next_id = max(self.next_id, alert['id'] + 1)
+        self.ids = np.append(self.ids, alert['id'])
+        self.subnets = np.append(self.subnets, alert['subnet'])
+        self.user_ids = np.append(self.user_ids, alert['user_id'])
+        self.kinds = np.append(self.kinds, np.int8(CONDITION_TYPES.index(alert['type'])))
+        self.thresholds = np.append(self.thresholds, alert['threshold'])
+        self.windows = np.append(self.windows, alert['window'])
+        self.notify = np.append(self.notify, np.int32(notify_code(alert.get('notify'))))
+        self.sides = np.append(self.sides, np.int8(0))
+        return alert
+
+    def _keep(self, keep: np.ndarray):
+        for column in ('ids', 'subnets', 'user_ids', 'kinds', 'thresholds', 'windows', 'notify', 'sides'):
+            setattr(self, column, getattr(self, column)[keep])
+
+    def remove_user(self, subnet_uid: int, user_id: int) -> int:
+        """Remove a user's alerts for a subnet, returning how many there were"""
+        matched = (self.subnets == subnet_uid) & (self.user_ids == user_id)
+        self._keep(~matched)
+        return int(matched.sum())
+
+    def remove_ids(self, ids):
+        self._keep(~np.isin(self.ids, list(ids)))
+
+    def to_dicts(self, mask: Optional[np.ndarray] = None) -> List[Dict]:
+        positions = np.flatnonzero(mask) if mask is not None else range(len(self))
+        return [{
+            'id': int(self.ids[i]),
+            'subnet': int(self.subnets[i]),
+            'user_id': int(self.user_ids[i]),
+            'type': CONDITION_TYPES[self.kinds[i]],
+            'threshold': float(self.thresholds[i]),
+            'window': float(self.windows[i]),
+            **({'notify': list(NOTIFY_TARGET_SETS[self.notify[i]])} if self.notify[i] else {})
+        } for i in positions]
+
+    def user_alerts(self, user_id: int) -> List[Dict]:
+        return self.to_dicts(self.user_ids == user_id)
+
+    def evaluate(self, history: 'PriceHistory', now: float) -> List[Tuple[Dict, float, float, str]]:
+        """Remove and return every alert that fires now as (alert, current_price, target_price, description)"""
+        if not len(self) or history is None:
+            return []
+        in_range = (self.subnets >= 0) & (self.subnets < history.subnets)
+        rows = np.unique(self.subnets[in_range])
+        if not len(rows):
+            return []
+        
+        # Sample windows of the watched subnets, put in time order (unwritten slots first)
+        counts, data = history.arrays()
+        samples = data[rows]
+        valid = np.arange(history.samples)[None, :] < counts[rows][:, None]
+        order = np.argsort(np.where(valid, samples[:, :, 1], -np.inf), axis=1, kind='stable')
+        timestamps = np.take_along_axis(samples[:, :, 1], order, axis=1)
+        prices = np.take_along_axis(samples[:, :, 2], order, axis=1)
+        valid = np.take_along_axis(valid, order, axis=1)
+        current = prices[:, -1]
+        
+        # Prefix sums per subnet, so any window's statistics are a difference of two entries
+        # instead of a pass over its samples: O(subnets * samples + windows * subnets) per tick
+        subnet_count, sample_count = prices.shape
+        log_returns = np.diff(np.log(np.where(valid & (prices > 0), prices, 1.0)), axis=1)
+        leading_zero = np.zeros((subnet_count, 1))
+        price_sums = np.concatenate([leading_zero, np.cumsum(np.where(valid, prices, 0.0), axis=1)], axis=1)
+        return_sums = np.concatenate([leading_zero, np.cumsum(log_returns, axis=1)], axis=1)
+        square_sums = np.concatenate([leading_zero, np.cumsum(log_returns ** 2, axis=1)], axis=1)
+        
+        # One row of statistics per distinct window length: shape (windows, subnets). Unwritten slots sort
+        # first, so each window is a suffix of its subnet's samples starting at the first one inside it.
+        windows, window_index = np.unique(self.windows, return_inverse=True)
+        ordered_timestamps = np.where(valid, timestamps, -np.inf)
+        starts = np.stack([
+            np.searchsorted(subnet_timestamps, now - windows, side='left') for subnet_timestamps in ordered_timestamps
+        ], axis=1)
+        columns = np.arange(subnet_count)[None, :]
+        first = np.minimum(starts, sample_count - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            window_counts = sample_count - starts
+            start = np.where(window_counts >= 2, prices[columns, first], np.nan)
+            change = (current[None] - start) / start * 100
+            moving_average = np.where(
+                window_counts >= 2, (price_sums[:, -1][None] - price_sums[columns, starts]) / window_counts, np.nan
+            )
+            
+            # Returns between consecutive samples that are both in the window
+            pair_counts = window_counts - 1
+            return_total = return_sums[:, -1][None] - return_sums[columns, first]
+            square_total = square_sums[:, -1][None] - square_sums[columns, first]
+            mean = return_total / pair_counts
+            variance = np.maximum(square_total - pair_counts * mean ** 2, 0.0) / (pair_counts - 1)
+            volatility = np.where(pair_counts >= 2, np.sqrt(variance) * 100, np.nan)
+            
+            # Look up each alert's statistics
+            row = np.minimum(np.searchsorted(rows, self.subnets), len(rows) - 1)
+            alert_change = change[window_index, row]
+            alert_average = moving_average[window_index, row]
+            alert_volatility = volatility[window_index, row]
+            alert_current = current[row]
+            side = np.sign(np.nan_to_num(alert_current - alert_average)).astype(np.int8)
+        
+        is_pct = self.kinds == 0
+        is_ma = self.kinds == 1
+        is_vol = self.kinds == 2
+        fired = is_pct & np.where(self.thresholds >= 0, alert_change >= self.thresholds, alert_change <= self.thresholds)
+        fired |= is_ma & (self.sides != 0) & (side != 0) & (side != self.sides)
+        fired |= is_vol & (alert_volatility >= self.thresholds)
+        fired &= in_range
+        self.sides = np.where(is_ma & (side != 0), side, self.sides).astype(np.int8)
+        
+        results = []
+        for i, alert in zip(np.flatnonzero(fired), self.to_dicts(fired)):
+            window = format_window(alert['window'])
+            price = float(alert_current[i])
+            if alert['type'] == 'pct':
+                target = float(start[window_index[i], row[i]]) * (1 + alert['threshold'] / 100)
+                description = f"moved {alert_change[i]:+.2f}% in {window}"
+            elif alert['type'] == 'ma':
+                target = float(alert_average[i])
+                description = f"crossed {'above' if side[i] > 0 else 'below'} its {window} moving average"
+            else:
+                target = price
+                description = f"volatility {alert_volatility[i]:.2f}% over {window}"
+            results.append((alert, price, target, description))
+        self._keep(~fired)
+        return results
+
+condition_alerts = ConditionAlerts()
+
+async def refresh_price_snapshot(block: Optional[int] = None) -> Dict[int, Tuple[float, str, int]]:
+    """Fetch the price and name of every subnet in one bulk query at a single block (default: latest)"""
+    if block is None:
+        block = await chain.call('get_current_block')
+    subnets = await chain.call('all_subnets', block) or []
+    snapshot = {
+        subnet.netuid: (float(subnet.price), subnet.subnet_name, block)
+        for subnet in subnets
+    }
+    await record_price_snapshot(snapshot, block)
+    logger.debug(f"Fetched prices for {len(snapshot)} subnets at block {block}")
+    return snapshot
+
+async def record_price_snapshot(snapshot: Dict[int, Tuple[float, str, int]], block: int):
+    """Seed the price cache and the price history with freshly fetched prices"""
+    # Seed the cache so interactive commands rarely need the chain themselves
+    price_cache.seed(snapshot)
+    if price_history is not None:
+        now = time.time()
+        for subnet_uid, (price, _, _) in snapshot.items():
+            price_history.record(subnet_uid, block, now, price)
+        await price_history.maybe_flush()
+
+def query_subnet_pools(subtensor, subnet_uids: tuple, block: int) -> Dict[int, tuple]:
+    """(SubnetTAO, SubnetAlphaIn) pool reserves of each subnet at a block, in one storage query
+    (runs on a chain worker thread)"""
+    substrate = subtensor.substrate
+    keys = [
+        substrate.create_storage_key('SubtensorModule', item, [subnet_uid])
+        for subnet_uid in subnet_uids for item in ('SubnetTAO', 'SubnetAlphaIn')
+    ]
+    values = [getattr(value, 'value', value) for _, value in substrate.query_multi(keys, substrate.get_block_hash(block))]
+    return {subnet_uid: (values[2 * i], values[2 * i + 1]) for i, subnet_uid in enumerate(subnet_uids)}
+
+class BlockPriceReader:
+    """Prices at each new block for the subnets being watched, without fetching every subnet every block.
+    
+    A subnet's price only moves when its pool reserves (SubnetTAO and SubnetAlphaIn) do, so each block reads just
+    those storage entries of the watched subnets in one query, and fetches prices only for the subnets whose
+    reserves changed. Every full_interval seconds it takes a full all_subnets snapshot instead, which keeps the
+    price cache, subnet names and every subnet's price history current.
+    """
+
+    def __init__(self, full_interval: float):
+        self.full_interval = full_interval
+        self.last_full = float('-inf')
+        # Subnets of the last full snapshot, and the reserves each watched subnet was last read with
+        self.subnets: List[int] = []
+        self.pools: Dict[int, tuple] = {}
+
+    async def read(self, block: int, subnet_uids=None) -> Dict[int, Tuple[float, str, int]]:
+        """Snapshot of the subnets (default: every subnet of the last full snapshot) whose price may have changed"""
+        if time.monotonic() - self.last_full >= self.full_interval:
+            snapshot = await refresh_price_snapshot(block)
+            self.last_full = time.monotonic()
+            self.subnets = sorted(snapshot)
+            # Read the reserves at the same block, so the next block only fetches subnets that really moved
+            watched = tuple(sorted(self.subnets if subnet_uids is None else subnet_uids))
+            self.pools = await chain.call(query_subnet_pools, watched, block) if watched else {}
+            return snapshot
+        
+        watched = tuple(sorted(self.subnets if subnet_uids is None else subnet_uids))
+        if not watched:
+            return {}
+        pools = await chain.call(query_subnet_pools, watched, block)
+        changed = [subnet_uid for subnet_uid in watched if pools[subnet_uid] != self.pools.get(subnet_uid)]
+        self.pools = pools
+        subnets = await asyncio.gather(*(chain.call('subnet', subnet_uid, block) for subnet_uid in changed))
+        snapshot = {
+            subnet_uid: (float(subnet.price), subnet.subnet_name, block)
+            for subnet_uid, subnet in zip(changed, subnets) if subnet
+        }
+        await record_price_snapshot(snapshot, block)
+        logger.debug(f"Block {block}: read reserves of {len(watched)} subnets, fetched {len(snapshot)} prices")
+        return snapshot
+
+async def get_subnet_snapshot(subnet_uid: int) -> Optional[Tuple[float, str, int]]:
+    """Get (price, name, block) for a subnet from the price cache, or None if it does not exist"""
+    return await price_cache.get(subnet_uid)
+
+def paginate_lines(lines, limit: int = DISCORD_MESSAGE_LIMIT):
+    """Lazily group lines into pages of at most limit characters, breaking only between lines"""
+    current = ""
+    for line in lines:
+        # A single line longer than the limit has to be cut
+        while len(line) > limit:
+            if current:
+                yield current
+                current = ""
+            yield line[:limit]
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            yield current
+            current = line
+        else:
+            current = candidate
+    if current:
+        yield current
+
+def split_message(blocks: List[str], limit: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    """Join message blocks into as few messages as fit Discord's limit, breaking only between lines"""
+    return list(paginate_lines("\n\n".join(blocks).split("\n"), limit))
+
+class UserCache:
+    """Bounded LRU/TTL cache in front of bot.fetch_user, merging concurrent fetches of the same user"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        # {user_id: (user, fetched_at)}, least recently used first
+        self.users: OrderedDict = OrderedDict()
+        self.in_flight: Dict[int, asyncio.Future] = {}
+
+    async def get(self, user_id: int):
+        """Get a user from the client's own cache, then ours, and only then the REST API"""
+        user = bot.get_user(user_id)
+        if user is not None:
+            return user
+        
+        cached = self.users.get(user_id)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            self.users.move_to_end(user_id)
+            return cached[0]
+        
+        future = self.in_flight.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(bot.fetch_user(user_id))
+            self.in_flight[user_id] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(user_id, None))
+        user = await asyncio.shield(future)
+        
+        self.users[user_id] = (user, time.monotonic())
+        self.users.move_to_end(user_id)
+        while len(self.users) > self.max_size:
+            self.users.popitem(last=False)
+        return user
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+def user_mention(user_id: int) -> str:
+    """Mention a user by ID; Discord renders it without us fetching the user"""
+    return f"<@{user_id}>"
+
+class Notifier(abc.ABC):
+    """Deliver alert notifications to one target in batches, from its own bounded queue and worker pool.
+    
+    Failed batches are retried with exponential backoff by the worker that sent them, so a slow or failing
+    target only ever holds back itself. When its queue is full, new notifications are dropped and counted.
+    Subclasses implement send_batch; it may remove delivered notifications from the batch, so that a retry
+    only resends the rest, and hand notifications that can never be delivered to reject.
+    """
+
+    default_concurrency = 1
+
+    def __init__(self, name: str, concurrency: int, max_attempts: int, retry_delay: float, batch_size: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+        # Notifications rejected so far per batch being delivered: {id(batch): count}
+        self.rejected: Dict[int, int] = {}
+        self.latencies = deque(maxlen=1000)
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # Created on first use inside the event loop; before Python 3.10 a queue binds to the loop it is created in
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+        return self._queue
+
+    def start(self):
+        """Start the worker pool (only once)"""
+        if self.workers:
+            return
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+    def submit(self, notifications: List[Dict]):
+        """Queue notifications without waiting"""
+        queued_at = time.monotonic()
+        for notification in notifications:
+            try:
+                self.queue.put_nowait((queued_at, notification))
+            except asyncio.QueueFull:
+                self.failed += 1
+                NOTIFY_FAILURES.inc(target=self.name, reason='queue_full')
+        if self.queue.full():
+            logger.warning(f"Notification queue for {self.name} is full, dropping notifications")
+
+    async def _worker(self):
+        while True:
+            items = [await self.queue.get()]
+            while len(items) < self.batch_size and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            try:
+                if await self._deliver([notification for _, notification in items]):
+                    now = time.monotonic()
+                    self.latencies.extend(now - queued_at for queued_at, _ in items)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    async def _deliver(self, batch: List[Dict]) -> bool:
+        """Send a batch, retrying what is left of it; True if nothing was given up on after retries"""
+        count = len(batch)
+        self.rejected[id(batch)] = 0
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    with NOTIFY_SEND_DURATION.time(target=self.name):
+                        await self.send_batch(batch)
+                    delivered = count - self.rejected[id(batch)]
+                    self.sent += delivered
+                    NOTIFICATIONS_SENT.inc(delivered, target=self.name)
+                    return True
+                except Exception as e:
+                    if attempt == self.max_attempts:
+                        delivered = count - len(batch) - self.rejected[id(batch)]
+                        self.sent += delivered
+                        NOTIFICATIONS_SENT.inc(delivered, target=self.name)
+                        self.failed += len(batch)
+                        NOTIFY_FAILURES.inc(len(batch), target=self.name, reason='attempts')
+                        logger.warning(f"Giving up on {len(batch)} notifications to {self.name} after {attempt} attempts: {e}")
+                        return False
+                    # Honour a rate limit's retry_after (Discord 429s), otherwise back off exponentially
+                    delay = getattr(e, 'retry_after', None) or self.retry_delay * 2 ** (attempt - 1)
+                    NOTIFY_RETRIES.inc(target=self.name)
+                    logger.warning(f"Error sending notifications to {self.name}, retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+        finally:
+            del self.rejected[id(batch)]
+
+    def reject(self, batch: List[Dict], notifications: List[Dict], reason: str):
+        """Give up on notifications of a batch that retrying cannot deliver, removing them from it"""
+        rejected = {id(notification) for notification in notifications}
+        batch[:] = [notification for notification in batch if id(notification) not in rejected]
+        self.rejected[id(batch)] += len(notifications)
+        self.failed += len(notifications)
+        NOTIFY_FAILURES.inc(len(notifications), target=self.name, reason=reason)
+
+    @abc.abstractmethod
+    async def send_batch(self, batch: List[Dict]):
+        """Deliver a batch of notifications, raising to have what is left of it retried"""
+
+    def stats(self) -> Dict:
+        """Queue depth, delivery counters and queue-to-delivery latency percentiles in seconds"""
+        latencies = sorted(self.latencies)
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+        return {
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'sent': self.sent,
+            'failed': self.failed,
+            'latency_p50': percentile(0.5),
+            'latency_p95': percentile(0.95)
+        }
+
+class DMNotifier(Notifier):
+    """Send alerts as Discord DMs: one DM per user and batch, merging that user's notifications into as few
+    messages as fit. Users who do not accept DMs are given up on rather than retried."""
+
+    default_concurrency = NOTIFY_WORKERS
+
+    def __init__(self, name: str, **settings):
+        super().__init__(name, **settings)
+        # One send at a time per user, so we never race ourselves on a DM channel's rate-limit bucket.
+        # Each entry is [lock, number of deliveries using it] so idle locks can be dropped.
+        self.user_locks: Dict[int, list] = {}
+
+    async def send_batch(self, batch: List[Dict]):
+        users: Dict[int, List[Dict]] = {}
+        for notification in batch:
+            users.setdefault(notification['user_id'], []).append(notification)
+        # One user's failure does not hold back the others; what is left is retried after the whole pass
+        error = None
+        for user_id, notifications in users.items():
+            try:
+                await self._send_dm(batch, user_id, notifications)
+            except discord.Forbidden as e:
+                # DMs are closed; retrying will not help
+                logger.warning(f"Cannot DM user {user_id}: {e}")
+                self.reject(batch, notifications, 'forbidden')
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    async def _send_dm(self, batch: List[Dict], user_id: int, notifications: List[Dict]):
+        # A retry carries the parts still to send on the user's first notification, so sent parts are not repeated
+        parts = notifications[0].get('dm_parts') or split_message([n['message'] for n in notifications])
+        lock_entry = self.user_locks.setdefault(user_id, [asyncio.Lock(), 0])
+        lock_entry[1] += 1
+        try:
+            async with lock_entry[0]:
+                user = await user_cache.get(user_id)
+                for sent, part in enumerate(parts):
+                    try:
+                        with DM_SEND_DURATION.time():
+                            await user.send(part)
+                    except discord.Forbidden:
+                        raise
+                    except Exception:
+                        if sent:
+                            first = next(i for i, notification in enumerate(batch) if notification is notifications[0])
+                            batch[first] = {**notifications[0], 'dm_parts': parts[sent:]}
+                        raise
+            DMS_SENT.inc()
+            delivered = {id(notification) for notification in notifications}
+            batch[:] = [notification for notification in batch if id(notification) not in delivered]
+        finally:
+            lock_entry[1] -= 1
+            if not lock_entry[1]:
+                del self.user_locks[user_id]
+
+class WebhookNotifier(Notifier):
+    """POST each batch to a URL as {"alerts": [notification, ...]}, over one pooled aiohttp session"""
+
+    default_concurrency = NOTIFY_WORKERS
+
+    def __init__(self, name: str, url: str, **settings):
+        super().__init__(name, **settings)
+        if urllib.parse.urlsplit(url).scheme not in ('http', 'https'):
+            raise ValueError(f"Webhook target {name} needs an http(s) URL, got {url!r}")
+        self.url = url
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def send_batch(self, batch: List[Dict]):
+        if self.session is None:
+            # Created on first use, inside the event loop; user:pass in the URL is sent as basic auth
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=NOTIFY_TIMEOUT))
+        # Redirects are not followed: a 301/302/303 would resend the batch as a GET without its body
+        async with self.session.post(self.url, json={'alerts': batch}, allow_redirects=False) as response:
+            if not 200 <= response.status < 300:
+                raise ConnectionError(f"HTTP {response.status}")
+
+    async def stop(self):
+        await super().stop()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+class UnixSocketNotifier(Notifier):
+    """Write notifications as JSON lines to a Unix socket, over one connection that is reopened after errors"""
+
+    def __init__(self, name: str, path: str, **settings):
+        super().__init__(name, **settings)
+        self.path = path
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def send_batch(self, batch: List[Dict]):
+        if self.writer is None or self.writer.is_closing():
+            _, self.writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), NOTIFY_TIMEOUT)
+        try:
+            self.writer.write(''.join(json.dumps(notification) + '\n' for notification in batch).encode())
+            await asyncio.wait_for(self.writer.drain(), NOTIFY_TIMEOUT)
+        except Exception:
+            self.writer.close()
+            self.writer = None
+            raise
+
+    async def stop(self):
+        await super().stop()
+        if self.writer is not None:
+            self.writer.close()
+
+class FileNotifier(Notifier):
+    """Append notifications as JSON lines to a file, on a worker thread"""
+
+    def __init__(self, name: str, path: str, **settings):
+        super().__init__(name, **settings)
+        self.path = path
+
+    def _append(self, data: str):
+        with open(self.path, 'a') as f:
+            f.write(data)
+
+    async def send_batch(self, batch: List[Dict]):
+        await asyncio.to_thread(self._append, ''.join(json.dumps(notification) + '\n' for notification in batch))
+
+class ChannelNotifier(Notifier):
+    """Post notifications to a Discord channel, mentioning each alert's owner, as few messages as fit"""
+
+    def __init__(self, name: str, channel_id: str, **settings):
+        super().__init__(name, **settings)
+        self.channel_id = int(channel_id)
+
+    async def send_batch(self, batch: List[Dict]):
+        channel = bot.get_channel(self.channel_id) or await bot.fetch_channel(self.channel_id)
+        while batch:
+            content = f"{user_mention(batch[0]['user_id'])} {batch[0]['message']}"[:DISCORD_MESSAGE_LIMIT]
+            taken = 1
+            while taken < len(batch):
+                block = f"{user_mention(batch[taken]['user_id'])} {batch[taken]['message']}"
+                if len(content) + 2 + len(block) > DISCORD_MESSAGE_LIMIT:
+                    break
+                content += "\n\n" + block
+                taken += 1
+            await channel.send(content)
+            del batch[:taken]
+
+class MemoryNotifier(Notifier):
+    """Local stand-in sink that keeps delivered notifications in `delivered`, optionally taking `delay` seconds per batch"""
+
+    def __init__(self, name: str, delay: str = '', **settings):
+        super().__init__(name, **settings)
+        self.delay = float(delay or 0)
+        self.delivered: List[Dict] = []
+
+    async def send_batch(self, batch: List[Dict]):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.delivered.extend(batch)
+
+NOTIFIER_KINDS = {
+    'webhook': WebhookNotifier,
+    'unix': UnixSocketNotifier,
+    'file': FileNotifier,
+    'channel': ChannelNotifier,
+    'memory': MemoryNotifier
+}
+
+def notifier_settings(name: str, notifier_class) -> Dict:
+    """Delivery settings of one target: the NOTIFY_* defaults, overridden by NOTIFY_<NAME>_*"""
+    prefix = f"NOTIFY_{name.upper()}_"
+    return {
+        'concurrency': int(os.getenv(prefix + 'CONCURRENCY', notifier_class.default_concurrency)),
+        'max_attempts': int(os.getenv(prefix + 'MAX_ATTEMPTS', NOTIFY_MAX_ATTEMPTS)),
+        'retry_delay': float(os.getenv(prefix + 'RETRY_DELAY', NOTIFY_RETRY_DELAY)),
+        'batch_size': int(os.getenv(prefix + 'BATCH_SIZE', NOTIFY_BATCH_SIZE))
+    }
+
+def build_notifiers(targets: str) -> Dict[str, Notifier]:
+    """Parse NOTIFY_TARGETS into {name: notifier}; 'dm' is always the Discord DM notifier"""
+    built: Dict[str, Notifier] = {'dm': DMNotifier('dm', **notifier_settings('dm', DMNotifier))}
+    for spec in filter(None, (part.strip() for part in targets.split(','))):
+        name, _, address = spec.partition('=')
+        kind, _, address = address.partition(':')
+        name = name.strip()
+        if not name or name in built or kind not in NOTIFIER_KINDS:
+            raise ValueError(f"Bad NOTIFY_TARGETS entry {spec!r}: expected name=kind:address with a new name "
+                             f"and kind one of {', '.join(NOTIFIER_KINDS)}")
+        notifier_class = NOTIFIER_KINDS[kind]
+        built[name] = notifier_class(name, address, **notifier_settings(name, notifier_class))
+    unknown = set(NOTIFY_DEFAULT_TARGETS) - set(built)
+    if unknown or not NOTIFY_DEFAULT_TARGETS:
+        raise ValueError(f"NOTIFY_DEFAULT_TARGETS names unknown targets: {', '.join(sorted(unknown)) or '(none)'}")
+    return built
+
+# Notification targets by name
+notifiers: Dict[str, Notifier] = build_notifiers(NOTIFY_TARGETS)
+
+def alert_targets(alert: Dict) -> List[str]:
+    """Names of the targets an alert notifies, falling back to the defaults for targets no longer configured"""
+    targets = [name for name in alert.get('notify') or NOTIFY_DEFAULT_TARGETS if name in notifiers]
+    if not targets:
+        logger.warning(f"None of the alert's targets {alert.get('notify')} are configured, using the defaults")
+        return NOTIFY_DEFAULT_TARGETS
+    return targets
 
-# Store price alerts: {subnet_uid: {user_id: target_price}}
-price_alerts: Dict[int, Dict[int, float]] = {}
+def dispatch_notifications(triggers: List[Dict]):
+    """Queue every trigger's notification on its alert's targets, one submit per target"""
+    routed: Dict[str, List[Dict]] = {}
+    for trigger in triggers:
+        notification = {
+            'subnet': trigger['subnet'],
+            'kind': 'condition' if 'condition' in trigger else 'price',
+            **trigger['entry'],
+            'message': trigger['message']
+        }
+        for name in alert_targets(trigger.get('condition') or trigger['alert']):
+            routed.setdefault(name, []).append(notification)
+    for name, notifications in routed.items():
+        notifiers[name].submit(notifications)
 
-# Store alert history: {subnet_uid: [{user_id: int, target_price: float, triggered_price: float, timestamp: str}]}
-alert_history: Dict[int, List[Dict]] = {}
+# Price each watched subnet was last evaluated at: {subnet_uid: price}
+last_evaluated_prices: Dict[int, float] = {}
 
-def load_alerts():
-    """Load alerts from JSON file"""
-    global price_alerts, alert_history
-    try:
-        # Load price alerts
-        if os.path.exists(ALERTS_FILE):
-            with open(ALERTS_FILE, 'r') as f:
-                data = json.load(f)
-                price_alerts = {}
-                for subnet_id, alerts in data.items():
-                    price_alerts[int(subnet_id)] = {}
-                    for user_id, user_alerts in alerts.items():
-                        price_alerts[int(subnet_id)][int(user_id)] = []
-                        if isinstance(user_alerts, list):
-                            for alert in user_alerts:
-                                price_alerts[int(subnet_id)][int(user_id)].append({
-                                    'target_price': float(alert['target_price']),
-                                    'initial_price': float(alert['initial_price'])
-                                })
-                        else:
-                            # Handle old format
-                            price_alerts[int(subnet_id)][int(user_id)].append({
-                                'target_price': float(user_alerts),
-                                'initial_price': float(user_alerts)
-                            })
-            print(f"Loaded {len(price_alerts)} alerts from {ALERTS_FILE}")
-            print(f"Alert details: {price_alerts}")
-        else:
-            print(f"No existing alerts file found at {ALERTS_FILE}")
+def evaluate_alerts(snapshot: Dict[int, Tuple[float, str, int]], subnet_uids,
+                    indexes: Optional[Dict[int, AlertIndex]] = None,
+                    conditions: Optional[ConditionAlerts] = None,
+                    last_prices: Optional[Dict[int, float]] = None,
+                    history: Optional[PriceHistory] = None) -> List[Dict]:
+    """Pop every alert crossed by the snapshot prices of the given subnets, plus every condition alert that fires.
+    
+    Returns one trigger per fired alert: {'subnet', 'user_id', 'alert' or 'condition', 'entry', 'message'}.
+    The alerts have left the index already; apply_triggers records them and queues their DMs.
+    Evaluates this process's alerts and price history unless an evaluator shard passes its own.
+    """
+    indexes = alert_index if indexes is None else indexes
+    conditions = condition_alerts if conditions is None else conditions
+    last_prices = last_evaluated_prices if last_prices is None else last_prices
+    history = price_history if history is None else history
+    triggers = []
+    
+    for subnet_uid in subnet_uids:
+        try:
+            if subnet_uid not in indexes:
+                continue
+            logger.debug("Checking subnet %s...", subnet_uid)
+            if subnet_uid not in snapshot:
+                logger.warning("Subnet %s does not exist", subnet_uid)
+                continue
+                
+            current_price, _, block = snapshot[subnet_uid]
+            logger.debug("Subnet %s current price: %s (block %s)", subnet_uid, current_price, block)
+            last_prices[subnet_uid] = current_price
             
-        # Load alert history
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r') as f:
-                data = json.load(f)
-                alert_history = {}
-                for subnet_id, history in data.items():
-                    alert_history[int(subnet_id)] = []
-                    for alert in history:
-                        alert_history[int(subnet_id)].append({
-                            'user_id': int(alert['user_id']),
-                            'target_price': float(alert['target_price']),
-                            'initial_price': float(alert['initial_price']),
-                            'triggered_price': float(alert['triggered_price']),
-                            'direction': alert['direction'],
-                            'timestamp': alert['timestamp']
-                        })
-            print(f"Loaded alert history from {HISTORY_FILE}")
-            print(f"History details: {alert_history}")
-        else:
-            print(f"No existing history file found at {HISTORY_FILE}")
+            # Pull every alert whose threshold this price has crossed
+            index = indexes[subnet_uid]
+            triggered = index.pop_triggered(current_price)
+            
+            for user_id, alert_data in triggered:
+                target_price = alert_data['target_price']
+                initial_price = alert_data['initial_price']
+                direction = "increased" if target_price > initial_price else "decreased"
+                if current_price == target_price:
+                    direction = "matched"
+                
+                triggers.append({
+                    'subnet': subnet_uid,
+                    'user_id': user_id,
+                    'alert': alert_data,
+                    'entry': {
+                        'user_id': user_id,
+                        'target_price': target_price,
+                        'initial_price': initial_price,
+                        'triggered_price': current_price,
+                        'direction': direction,
+                        'timestamp': datetime.now().isoformat()
+                    },
+                    'message': (
+                        f"🚨 **Price Alert for Subnet {subnet_uid}** 🚨\n"
+                        f"Target Price: {target_price:.4f} τ\n"
+                        f"Current Price: {current_price:.4f} τ\n"
+                        f"Price has {direction} from {initial_price:.4f} τ"
+                    )
+                })
             
+            if not index:
+                del indexes[subnet_uid]
+        except Exception as e:
+            logger.error(f"Error checking subnet {subnet_uid}: {e}")
+            continue
+    
+    # Percent-move, moving-average and volatility alerts, all evaluated at once
+    try:
+        for alert, price, target, description in conditions.evaluate(history, time.time()):
+            subnet_uid = alert['subnet']
+            triggers.append({
+                'subnet': subnet_uid,
+                'user_id': alert['user_id'],
+                'condition': alert,
+                'entry': {
+                    'user_id': alert['user_id'],
+                    'target_price': target,
+                    'initial_price': target,
+                    'triggered_price': price,
+                    'direction': condition_direction(alert, price, target),
+                    'timestamp': datetime.now().isoformat()
+                },
+                'message': (
+                    f"🚨 **Price Alert for Subnet {subnet_uid}** 🚨\n"
+                    f"Current Price: {price:.4f} τ\n"
+                    f"Price has {description}"
+                )
+            })
     except Exception as e:
-        print(f"Error loading alerts/history: {e}")
-        print(f"Raw data: {data if 'data' in locals() else 'No data loaded'}")
-        price_alerts = {}
-        alert_history = {}
+        logger.error(f"Error checking condition alerts: {e}")
+    
+    return triggers
 
-def save_alerts():
-    """Save alerts and history to JSON files"""
+def apply_triggers(triggers: List[Dict]):
+    """Move triggered alerts to history and queue their notifications, one merged DM per user"""
+    for trigger in triggers:
+        if 'condition' in trigger:
+            record_condition_trigger(trigger['condition'], trigger['entry'])
+        else:
+            record_trigger(trigger['subnet'], trigger['user_id'], trigger['alert'], trigger['entry'])
+        TRIGGERS.inc(kind='condition' if 'condition' in trigger else 'price')
+    
+    # Hand delivery to each target's workers so a burst of alerts, or a slow target, never stalls evaluation
+    dispatch_notifications(triggers)
+    if triggers:
+        logger.info(f"Triggered {len(triggers)} alerts for {len({trigger['user_id'] for trigger in triggers})} users")
+    
+    maybe_compact_alerts()
+
+def changed_subnets(snapshot: Dict[int, Tuple[float, str, int]],
+                    indexes: Optional[Dict[int, AlertIndex]] = None,
+                    last_prices: Optional[Dict[int, float]] = None) -> List[int]:
+    """Watched subnets whose snapshot price differs from the price they were last evaluated at"""
+    indexes = alert_index if indexes is None else indexes
+    last_prices = last_evaluated_prices if last_prices is None else last_prices
+    return [
+        subnet_uid for subnet_uid in indexes
+        if subnet_uid in snapshot and last_prices.get(subnet_uid) != snapshot[subnet_uid][0]
+    ]
+
+async def check_subnet_prices():
+    """Check subnet prices and send alerts if target prices are reached"""
     try:
-        with open(ALERTS_FILE, 'w') as f:
-            json.dump(price_alerts, f)
-        print(f"Saved {len(price_alerts)} alerts to {ALERTS_FILE}")
+        logger.debug(f"Starting price check. Watching {len(alert_index)} subnets")
         
-        with open(HISTORY_FILE, 'w') as f:
-            json.dump(alert_history, f)
-        print(f"Saved alert history to {HISTORY_FILE}")
+        with SWEEP_DURATION.time(mode='poll'):
+            # Get all subnet prices in one query so the whole tick sees the same block
+            snapshot = await refresh_price_snapshot()
+            apply_triggers(evaluate_alerts(snapshot, list(alert_index)))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"DM delivery stats: {notifiers['dm'].stats()}")
+            logger.debug(f"Price cache stats: {price_cache.stats()}")
     except Exception as e:
-        print(f"Error saving alerts/history: {e}")
+        SWEEP_FAILURES.inc(mode='poll')
+        logger.error(f"Error checking subnet prices: {e}")
 
-async def check_subnet_prices():
-    """Check subnet prices and send alerts if target prices are reached"""
+# Prices of the watched subnets at each block in block mode
+block_prices = BlockPriceReader(CHECK_INTERVAL)
+
+def watched_subnets() -> set:
+    """Subnets with price or condition alerts"""
+    return set(alert_index) | set(condition_alerts.subnets.tolist())
+
+async def check_changed_subnets(block: int):
+    """Re-evaluate alerts only for watched subnets whose price changed since they were last evaluated.
+    
+    Only the pool reserves of the watched subnets are read per block; see BlockPriceReader.
+    """
     try:
-        print(f"Starting price check. Active alerts: {price_alerts}")
+        with SWEEP_DURATION.time(mode='block'):
+            snapshot = await block_prices.read(block, watched_subnets())
+            changed = changed_subnets(snapshot)
+            if changed:
+                logger.debug(f"Block {block}: prices changed on {len(changed)} watched subnets")
+            # Condition alerts look at the price windows, which move with every block
+            apply_triggers(evaluate_alerts(snapshot, changed))
+    except Exception as e:
+        SWEEP_FAILURES.inc(mode='block')
+        logger.error(f"Error checking prices for block {block}: {e}")
+
+class BlockWatcher:
+    """Check prices on every new block header; the polling scheduler takes over while the subscription is down"""
+
+    def __init__(self, on_block, stale_after: float, retry_delay: float = 10):
+        self.on_block = on_block
+        self.stale_after = stale_after
+        self.retry_delay = retry_delay
+        self.last_header = float('-inf')
+        self.latest_block: Optional[int] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.tasks: List[asyncio.Task] = []
+        self.stopping = False
+
+    @property
+    def live(self) -> bool:
+        """Whether a block header arrived recently enough that polling is unnecessary"""
+        return time.monotonic() - self.last_header < self.stale_after
+
+    def start(self):
+        """Start the subscription (only once)"""
+        if self.tasks:
+            return
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._subscribe_loop()), asyncio.create_task(self._consume())]
+
+    async def stop(self):
+        self.stopping = True
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def _subscribe_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self.stopping:
+            done = loop.create_future()
+            # A daemon thread rather than the executor, so a blocked subscription never holds up shutdown
+            threading.Thread(target=self._subscribe, args=(loop, done), name='block-headers', daemon=True).start()
+            try:
+                await done
+                logger.info("Block header subscription ended")
+            except Exception as e:
+                logger.warning(f"Block header subscription dropped, polling until it reconnects: {e}")
+            await asyncio.sleep(self.retry_delay)
+
+    def _subscribe(self, loop: asyncio.AbstractEventLoop, done: asyncio.Future):
+        """Blocking header subscription on its own connection (runs on the watcher thread)"""
+        def finish(exception: Optional[Exception] = None):
+            if done.done():
+                return
+            if exception is not None:
+                done.set_exception(exception)
+            else:
+                done.set_result(None)
         
-        # Get all subnets
-        subnets = list(range(101))  # Check all 101 subnets
+        def handler(message, update_nr, subscription_id):
+            number = message['header']['number']
+            if isinstance(number, str):
+                number = int(number, 16)
+            loop.call_soon_threadsafe(self._on_header, number)
+            # Returning a value ends the subscription
+            return True if self.stopping else None
         
-        for subnet_uid in subnets:
-            if subnet_uid not in price_alerts:
+        try:
+            connection = bt.subtensor(config=config)
+            try:
+                connection.substrate.subscribe_block_headers(handler)
+            finally:
+                connection.close()
+            loop.call_soon_threadsafe(finish)
+        except Exception as e:
+            loop.call_soon_threadsafe(finish, e)
+
+    def _on_header(self, block: int):
+        self.last_header = time.monotonic()
+        self.latest_block = block
+        self.wakeup.set()
+
+    async def _consume(self):
+        # Blocks that arrive while a check is running collapse into one check of the newest block
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            await self.on_block(self.latest_block)
+
+block_watcher = BlockWatcher(check_changed_subnets, BLOCK_STALE_SECONDS)
+
+async def poll_subnet_prices():
+    """Scheduled sweep; in block mode it only runs while the block subscription is down"""
+    if PRICE_CHECK_MODE == 'blocks' and block_watcher.live:
+        return
+    await check_subnet_prices()
+
+class TickScheduler:
+    """Run a coroutine every interval (plus jitter), skipping a tick while the previous run is still going"""
+
+    def __init__(self, func, interval: float, jitter: float):
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.task: Optional[asyncio.Task] = None
+        self.current: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.skipped = 0
+
+    @property
+    def started(self) -> bool:
+        return self.task is not None
+
+    def start(self):
+        """Start ticking; later calls (e.g. on_ready after a reconnect) do nothing"""
+        if self.started:
+            return
+        self.task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()) + random.uniform(0, self.jitter))
+            if self.current is not None and not self.current.done():
+                self.skipped += 1
+                logger.warning(f"Previous {self.func.__name__} run still going, skipping tick ({self.skipped} skipped so far)")
                 continue
-                
+            # If we fell behind, start counting from now rather than firing a burst of catch-up ticks
+            next_tick = max(next_tick, loop.time() - self.interval)
+            self.runs += 1
+            self.current = asyncio.create_task(self.func())
+
+    async def stop(self):
+        """Cancel the ticker and any run in flight"""
+        tasks = [task for task in (self.task, self.current) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+price_scheduler = TickScheduler(poll_subnet_prices, CHECK_INTERVAL, CHECK_JITTER)
+history_pruner = TickScheduler(prune_history, HISTORY_PRUNE_INTERVAL, CHECK_JITTER)
+
+def shard_of(subnet_uid: int) -> int:
+    """Evaluator shard that owns a subnet's alerts"""
+    return subnet_uid % SHARD_COUNT
+
+def shard_address():
+    """SHARD_ADDRESS as a multiprocessing address: host:port for TCP, anything else is a Unix socket path"""
+    host, _, port = SHARD_ADDRESS.rpartition(':')
+    if host and port.isdigit():
+        # Peers unpickle each other's messages, so anyone holding the key can run code in every process
+        if SHARD_AUTHKEY in PUBLIC_SHARD_AUTHKEYS:
+            raise ValueError(f"SHARD_ADDRESS {SHARD_ADDRESS} is a TCP address; set SHARD_AUTHKEY to a secret first")
+        return host, int(port)
+    return SHARD_ADDRESS
+
+class LocalChannel:
+    """In-process stand-in for ConnectionChannel, for tests and for wiring roles together without sockets"""
+
+    def __init__(self):
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.peer: Optional['LocalChannel'] = None
+
+    @classmethod
+    def pair(cls) -> Tuple['LocalChannel', 'LocalChannel']:
+        """Two connected ends; what one sends the other receives"""
+        first, second = cls(), cls()
+        first.peer, second.peer = second, first
+        return first, second
+
+    def send(self, message: Dict):
+        self.peer.inbox.put_nowait(message)
+
+    async def recv(self) -> Optional[Dict]:
+        """The next message, or None once the other end closed"""
+        return await self.inbox.get()
+
+    def close(self):
+        self.peer.inbox.put_nowait(None)
+
+class ConnectionChannel:
+    """Message channel over a multiprocessing Connection, with reader and writer threads so the event loop never blocks"""
+
+    def __init__(self, connection, loop: asyncio.AbstractEventLoop):
+        self.connection = connection
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: queue.Queue = queue.Queue()
+        threading.Thread(target=self._read, args=(loop,), name='channel-reader', daemon=True).start()
+        threading.Thread(target=self._write, name='channel-writer', daemon=True).start()
+
+    def _read(self, loop: asyncio.AbstractEventLoop):
+        try:
+            while True:
+                message = self.connection.recv()
+                loop.call_soon_threadsafe(self.inbox.put_nowait, message)
+        except (EOFError, OSError):
+            pass
+        loop.call_soon_threadsafe(self.inbox.put_nowait, None)
+
+    def _write(self):
+        while True:
+            message = self.outbox.get()
+            if message is None:
+                break
             try:
-                print(f"Checking subnet {subnet_uid}...")
-                # Get subnet info
-                subnet_info = subtensor.subnet(subnet_uid)
-                if not subnet_info:
-                    print(f"Subnet {subnet_uid} does not exist")
-                    continue
-                    
-                current_price = float(subnet_info.price)
-                print(f"Subnet {subnet_uid} current price: {current_price}")
-                
-                # Check alerts for this subnet
-                for user_id, user_alerts in price_alerts[subnet_uid].items():
-                    # Convert to list if it's not already (for backward compatibility)
-                    if not isinstance(user_alerts, list):
-                        user_alerts = [user_alerts]
-                    
-                    # Track which alerts to remove
-                    alerts_to_remove = []
-                    
-                    for alert_index, alert_data in enumerate(user_alerts):
-                        if isinstance(alert_data, dict):
-                            target_price = alert_data['target_price']
-                            initial_price = alert_data['initial_price']
-                        else:
-                            # Handle old format
-                            target_price = alert_data
-                            initial_price = target_price
-                        
-                        print(f"Checking alert for user {user_id}: target {target_price}, current {current_price}")
-                        
-                        # Determine if we're watching for price increase or decrease
-                        is_watching_increase = target_price > initial_price
-                        
-                        # Check if price has crossed the target or equals it
-                        if (is_watching_increase and current_price >= target_price) or \
-                           (not is_watching_increase and current_price <= target_price) or \
-                           (current_price == target_price):
-                            print(f"Alert triggered for subnet {subnet_uid}!")
-                            
-                            try:
-                                user = await bot.fetch_user(user_id)
-                                direction = "increased" if is_watching_increase else "decreased"
-                                if current_price == target_price:
-                                    direction = "matched"
-                                
-                                # Send alert via DM
-                                await user.send(
-                                    f"🚨 **Price Alert for Subnet {subnet_uid}** 🚨\n"
-                                    f"Target Price: {target_price:.4f} τ\n"
-                                    f"Current Price: {current_price:.4f} τ\n"
-                                    f"Price has {direction} from {initial_price:.4f} τ"
-                                )
-                                
-                                # Add to alert history
-                                if subnet_uid not in alert_history:
-                                    alert_history[subnet_uid] = []
-                                alert_history[subnet_uid].append({
-                                    'user_id': user_id,
-                                    'target_price': target_price,
-                                    'initial_price': initial_price,
-                                    'triggered_price': current_price,
-                                    'direction': direction,
-                                    'timestamp': datetime.now().isoformat()
-                                })
-                                
-                                # Mark this alert for removal
-                                alerts_to_remove.append(alert_index)
-                            except Exception as e:
-                                print(f"Error sending DM to user {user_id}: {e}")
-                                continue
-                        else:
-                            print(f"Price not reached for subnet {subnet_uid}: {current_price} {'<' if is_watching_increase else '>'} {target_price}")
-                    
-                    # Remove triggered alerts in reverse order to maintain indices
-                    for index in sorted(alerts_to_remove, reverse=True):
-                        del price_alerts[subnet_uid][user_id][index]
-                    
-                    # If no alerts left for this user in this subnet, clean up
-                    if not price_alerts[subnet_uid][user_id]:
-                        del price_alerts[subnet_uid][user_id]
-                        if not price_alerts[subnet_uid]:
-                            del price_alerts[subnet_uid]
-                    
-                    # Save alerts and history after processing all alerts
-                    save_alerts()
-            except Exception as e:
-                print(f"Error checking subnet {subnet_uid}: {e}")
+                self.connection.send(message)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error sending to shard peer: {e}")
+                break
+        try:
+            # Closing alone would leave the reader thread blocked in recv(); shutting the socket down wakes it
+            with socket.socket(fileno=os.dup(self.connection.fileno())) as sock:
+                sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+
+    def send(self, message: Dict):
+        self.outbox.put(message)
+
+    async def recv(self) -> Optional[Dict]:
+        """The next message, or None once the connection closed"""
+        return await self.inbox.get()
+
+    def close(self):
+        self.outbox.put(None)
+
+class ShardHub:
+    """Front end side of a sharded deployment.
+    
+    The price fetcher sends snapshots here, which are forwarded to every evaluator shard. Each evaluator
+    owns the alerts of the subnets with shard_of(subnet) == its shard: it gets them when it connects and
+    every change afterwards, and reports fired alerts back so they are recorded and DMed from here.
+    Evaluators keep their own price history for condition alerts from the snapshots, after a backlog of
+    the fetcher's samples that is requested from the fetcher whenever either side connects.
+    """
+
+    def __init__(self, shards: int):
+        self.shards = shards
+        self.evaluators: Dict[int, object] = {}
+        self.fetcher = None
+        self.tasks = set()
+        self.listener = None
+        self.snapshots = 0
+        self.remote_triggers = 0
+
+    def start(self, address):
+        """Accept fetcher and evaluator connections on the address"""
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)  # Stale socket from a previous run
+        self.listener = Listener(address, authkey=SHARD_AUTHKEY)
+        loop = asyncio.get_running_loop()
+        threading.Thread(target=self._accept, args=(loop,), name='shard-listener', daemon=True).start()
+        logger.info(f"Waiting for price fetcher and {self.shards} evaluator shards on {address}")
+
+    def _accept(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except AuthenticationError as e:
+                logger.warning(f"Rejected shard connection: {e}")
                 continue
-            
-    except Exception as e:
-        print(f"Error checking subnet prices: {e}")
+            except OSError:
+                break  # Listener closed
+            loop.call_soon_threadsafe(lambda connection=connection: self.attach(ConnectionChannel(connection, loop)))
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.close()
+        for channel in self.evaluators.values():
+            channel.close()
+
+    def attach(self, channel):
+        """Serve a connected fetcher or evaluator (any channel with send/recv/close)"""
+        task = asyncio.create_task(self._serve(channel))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def publish(self, subnet_uid: int, message: Dict):
+        """Send an alert change to the evaluator that owns the subnet; one that is not connected gets it on load"""
+        channel = self.evaluators.get(shard_of(subnet_uid))
+        if channel is not None:
+            channel.send(message)
+
+    def shard_state(self, shard: int) -> Dict:
+        """Every alert an evaluator shard owns"""
+        return {
+            'type': 'load',
+            'price_alerts': {
+                subnet_uid: index.to_dict() for subnet_uid, index in alert_index.items()
+                if shard_of(subnet_uid) == shard
+            },
+            'conditions': condition_alerts.to_dicts(condition_alerts.subnets % SHARD_COUNT == shard)
+        }
+
+    async def _serve(self, channel):
+        hello = await channel.recv()
+        if hello is None:
+            return
+        role, shard = hello.get('role'), hello.get('shard')
+        if role == 'evaluator':
+            if not 0 <= shard < self.shards:
+                logger.warning(f"Rejected evaluator for shard {shard}, SHARD_COUNT is {self.shards}")
+                channel.close()
+                return
+            previous = self.evaluators.get(shard)
+            if previous is not None:
+                previous.close()
+            self.evaluators[shard] = channel
+            channel.send(self.shard_state(shard))
+            if self.fetcher is not None:
+                self.fetcher.send({'type': 'history_request', 'shard': shard})
+        elif role == 'fetcher':
+            self.fetcher = channel
+            for evaluator_shard in self.evaluators:
+                channel.send({'type': 'history_request', 'shard': evaluator_shard})
+        logger.info(f"Shard peer connected: {role}" + (f" {shard}" if role == 'evaluator' else ""))
+        
+        try:
+            while True:
+                message = await channel.recv()
+                if message is None:
+                    break
+                if message['type'] == 'snapshot':
+                    self.snapshots += 1
+                    price_cache.seed(message['prices'])
+                    for evaluator in self.evaluators.values():
+                        evaluator.send(message)
+                elif message['type'] == 'history':
+                    evaluator = self.evaluators.get(message['shard'])
+                    if evaluator is not None:
+                        evaluator.send(message)
+                elif message['type'] == 'fired':
+                    self.remote_triggers += len(message['triggers'])
+                    apply_remote_triggers(message['triggers'])
+        except Exception as e:
+            logger.error(f"Error serving shard peer {role}: {e}")
+        finally:
+            if role == 'evaluator' and self.evaluators.get(shard) is channel:
+                del self.evaluators[shard]
+            if role == 'fetcher' and self.fetcher is channel:
+                self.fetcher = None
+            logger.warning(f"Shard peer disconnected: {role}" + (f" {shard}" if role == 'evaluator' else ""))
+
+shard_hub: Optional[ShardHub] = None
+
+def apply_remote_triggers(triggers: List[Dict]):
+    """Record triggers reported by an evaluator, skipping alerts that were removed here in the meantime"""
+    applied = []
+    for trigger in triggers:
+        if 'condition' in trigger:
+            alert_id = trigger['condition']['id']
+            if not np.any(condition_alerts.ids == alert_id):
+                continue
+            condition_alerts.remove_ids([alert_id])
+        elif not unindex_alert(trigger['subnet'], trigger['user_id'], trigger['alert']):
+            continue
+        applied.append(trigger)
+    apply_triggers(applied)
+
+async def connect_to_hub(hello: Dict) -> ConnectionChannel:
+    """Connect to the front end, retrying until it is up, and introduce ourselves"""
+    while True:
+        try:
+            connection = await asyncio.to_thread(Client, shard_address(), authkey=SHARD_AUTHKEY)
+            break
+        except (OSError, EOFError, AuthenticationError) as e:
+            logger.warning(f"Front end not reachable at {SHARD_ADDRESS}, retrying: {e}")
+            await asyncio.sleep(5)
+    channel = ConnectionChannel(connection, asyncio.get_running_loop())
+    channel.send(hello)
+    return channel
+
+def history_backlog(shard: int) -> Dict:
+    """The fetcher's price samples of every subnet an evaluator shard owns, for its condition alerts"""
+    samples = {}
+    if price_history is not None:
+        for subnet_uid in range(shard, price_history.subnets, SHARD_COUNT):
+            rows = price_history.export(subnet_uid)
+            if len(rows):
+                samples[subnet_uid] = rows
+    return {'type': 'history', 'shard': shard, 'samples': samples}
+
+async def serve_fetcher(channel):
+    """Fetch price snapshots on the check schedule (and every block in block mode) and publish them"""
+    open_price_history()
+    
+    # The fetcher holds no alerts, so in block mode it reads the reserves of every subnet
+    reader = BlockPriceReader(CHECK_INTERVAL)
+    
+    async def publish(block: Optional[int] = None):
+        try:
+            snapshot = await refresh_price_snapshot(block) if block is None else await reader.read(block)
+            channel.send({'type': 'snapshot', 'block': block, 'time': time.time(), 'prices': snapshot})
+        except Exception as e:
+            logger.error(f"Error publishing prices: {e}")
+    
+    watcher = BlockWatcher(publish, BLOCK_STALE_SECONDS)
+    
+    async def poll():
+        if PRICE_CHECK_MODE == 'blocks' and watcher.live:
+            return
+        await publish()
+    
+    scheduler = TickScheduler(poll, CHECK_INTERVAL, CHECK_JITTER)
+    scheduler.start()
+    if PRICE_CHECK_MODE == 'blocks':
+        watcher.start()
+    try:
+        # Run until the front end goes away, answering requests for the evaluators' history backlog
+        while True:
+            message = await channel.recv()
+            if message is None:
+                break
+            if message['type'] == 'history_request':
+                channel.send(history_backlog(message['shard']))
+        logger.warning("Front end disconnected")
+    finally:
+        await scheduler.stop()
+        await watcher.stop()
+
+class EvaluatorShard:
+    """One evaluator shard's alerts, kept apart from the front end's so several shards can share a process"""
+    
+    def __init__(self):
+        self.alert_index: Dict[int, AlertIndex] = {}
+        self.condition_alerts = ConditionAlerts()
+        self.last_evaluated_prices: Dict[int, float] = {}
+        # Built from the fetcher's backlog and the published snapshots, never from a local file, which only
+        # the fetcher writes and which an evaluator on another host or directory would not see
+        self.price_history = PriceHistory(None, PRICE_HISTORY_SUBNETS, PRICE_HISTORY_SAMPLES)
+    
+    def handle(self, message: Dict) -> List[Dict]:
+        """Apply one message from the hub, returning the triggers of a snapshot"""
+        kind = message['type']
+        if kind == 'load':
+            self.alert_index = build_alert_index(message['price_alerts'])
+            self.condition_alerts.load(message['conditions'])
+            self.last_evaluated_prices.clear()
+            price_alert_count = sum(len(index) for index in self.alert_index.values())
+            logger.info(f"Loaded {price_alert_count} price alerts and {len(self.condition_alerts)} condition alerts")
+        elif kind == 'add':
+            index = self.alert_index.get(message['subnet'])
+            if index is None:
+                index = self.alert_index[message['subnet']] = AlertIndex()
+            index.add(message['user_id'], message['alert'])
+        elif kind == 'remove':
+            self.condition_alerts.remove_user(message['subnet'], message['user_id'])
+            index = self.alert_index.get(message['subnet'])
+            if index is not None:
+                index.remove_user(message['user_id'])
+                if not index:
+                    del self.alert_index[message['subnet']]
+        elif kind == 'condition_add':
+            self.condition_alerts.add(message['alert'])
+        elif kind == 'history':
+            for subnet_uid, samples in message['samples'].items():
+                self.price_history.merge(subnet_uid, samples)
+        elif kind == 'snapshot':
+            prices = message['prices']
+            for subnet_uid, (price, _, block) in prices.items():
+                self.price_history.record(subnet_uid, block, message['time'], price)
+            # Polled snapshots re-check every subnet, block snapshots only the ones whose price moved
+            if message['block'] is None:
+                subnet_uids = list(self.alert_index)
+            else:
+                subnet_uids = changed_subnets(prices, self.alert_index, self.last_evaluated_prices)
+            with SWEEP_DURATION.time(mode='shard'):
+                return evaluate_alerts(prices, subnet_uids, self.alert_index, self.condition_alerts,
+                                       self.last_evaluated_prices, self.price_history)
+        return []
+
+async def serve_evaluator(channel, shard: Optional[EvaluatorShard] = None):
+    """Evaluate this shard's alerts against every published snapshot and report the ones that fire"""
+    shard = shard if shard is not None else EvaluatorShard()
+    while True:
+        message = await channel.recv()
+        if message is None:
+            logger.warning("Front end disconnected")
+            return
+        try:
+            triggers = shard.handle(message)
+            if triggers:
+                channel.send({'type': 'fired', 'triggers': triggers})
+                logger.debug(f"Reported {len(triggers)} triggered alerts")
+        except Exception as e:
+            logger.error(f"Error handling {message.get('type')} message: {e}")
+
+async def run_shard_worker(role: str, shard: int = 0):
+    """Entry point of the fetcher and evaluator processes"""
+    await start_metrics()
+    if role == 'evaluator':
+        channel = await connect_to_hub({'type': 'hello', 'role': 'evaluator', 'shard': shard})
+        await serve_evaluator(channel)
+    else:
+        channel = await connect_to_hub({'type': 'hello', 'role': 'fetcher'})
+        await serve_fetcher(channel)
+    channel.close()
+
+def start_shard_hub():
+    """Start routing between the fetcher, the evaluator shards and this front end"""
+    global shard_hub
+    shard_hub = ShardHub(SHARD_COUNT)
+    shard_hub.start(shard_address())
+
+async def start_metrics():
+    """Serve /metrics when METRICS_PORT is set"""
+    if not METRICS_PORT:
+        return
+    try:
+        await metrics.start(METRICS_HOST, METRICS_PORT)
+    except OSError as e:
+        logger.error(f"Error starting metrics server on {METRICS_HOST}:{METRICS_PORT}: {e}")
+
+# Set once warm_up has loaded alerts; commands that need them wait for it (see requires_state).
+# Created in setup_hook, inside the event loop.
+STARTUP_COMMAND_WAIT = float(os.getenv('STARTUP_COMMAND_WAIT', '10'))
+state_loaded: Optional[asyncio.Event] = None
+startup_task: Optional[asyncio.Task] = None
+started_up = False
+
+async def warm_up():
+    """Load alerts on a worker thread and open the first chain connection, concurrently"""
+    chain_ready = asyncio.create_task(chain.connect())
+    try:
+        await asyncio.to_thread(load_alerts)
+        logger.info(f"Loaded {count_price_alerts()} price alerts and {len(condition_alerts)} condition alerts")
+        open_price_history()
+        STARTUP_SECONDS.set(time.monotonic() - STARTED_AT, phase='state')
+    finally:
+        state_loaded.set()
+    await chain_ready
+
+class StillLoading(commands.CheckFailure):
+    """A command arrived before the alerts finished loading"""
+
+def requires_state():
+    """Hold a command until alerts are loaded, for up to STARTUP_COMMAND_WAIT seconds"""
+    async def predicate(ctx):
+        if not state_loaded.is_set():
+            try:
+                await asyncio.wait_for(state_loaded.wait(), STARTUP_COMMAND_WAIT)
+            except asyncio.TimeoutError:
+                raise StillLoading()
+        return True
+    return commands.check(predicate)
 
 def is_command_channel():
     """Check if the command is being used in the designated command channel"""
@@ -226,22 +3215,37 @@ def is_command_channel():
 
 @bot.event
 async def on_ready():
-    print(f'Bot is ready. Logged in as {bot.user.name}')
-    # Load saved alerts when bot starts
-    load_alerts()
-    print(f"Loaded alerts: {price_alerts}")
+    logger.info(f'Bot is ready. Logged in as {bot.user.name}')
+    # on_ready fires again after every reconnect; background tasks are set up only once
+    global started_up
+    if started_up:
+        logger.info("Reconnected, price checks already running")
+        return
+    started_up = True
     
-    # Schedule price checks every 1 minute
-    schedule.every(1).minutes.do(lambda: asyncio.create_task(check_subnet_prices()))
+    # Saved alerts load in the background from setup_hook; checks start once they are in
+    await state_loaded.wait()
+    for notifier in notifiers.values():
+        notifier.start()
+    history_pruner.start()
+    STARTUP_SECONDS.set(time.monotonic() - STARTED_AT, phase='ready')
+    logger.info(f"Ready {time.monotonic() - STARTED_AT:.1f}s after start")
     
-    # Run the scheduler in the background
-    while True:
-        schedule.run_pending()
-        await asyncio.sleep(1)
+    # As a front end, the fetcher and evaluator processes check prices and report back here
+    if PROCESS_ROLE == 'frontend':
+        start_shard_hub()
+        return
+    
+    # Check prices every CHECK_INTERVAL seconds, and on every new block in block mode
+    price_scheduler.start()
+    if PRICE_CHECK_MODE == 'blocks':
+        block_watcher.start()
 
 @bot.event
 async def on_command_error(ctx, error):
-    if isinstance(error, commands.CheckFailure):
+    if isinstance(error, StillLoading):
+        await ctx.send(f"⏳ {ctx.author.mention} The bot just restarted and is still loading alerts. Please try again in a moment.")
+    elif isinstance(error, commands.CheckFailure):
         if ctx.guild is None:  # If in DMs
             return  # Don't send message in DMs
         elif ctx.guild.id != ALLOWED_SERVER_ID:
@@ -251,81 +3255,96 @@ async def on_command_error(ctx, error):
         else:
             await ctx.send("❌ An error occurred while processing your command.")
     else:
-        print(f"Error: {error}")
+        logger.error(f"Error: {error}")
 
 @bot.command(name='setalert')
 @is_command_channel()
-async def set_alert(ctx, subnet_uid: int, target_price: float):
-    """Set a price alert for a specific subnet"""
+@requires_state()
+async def set_alert(ctx, subnet_uid: int, target: str, *args: str):
+    """Set a price alert (or a pct/ma/vol condition alert) for a specific subnet, optionally `to:` chosen targets"""
     try:
-        print(f"Setting alert for subnet {subnet_uid} with target price {target_price}")
+        try:
+            notify, args = parse_notify_targets(args)
+        except commands.BadArgument as e:
+            await ctx.send(f"❌ {ctx.author.mention} {e}")
+            return
+        try:
+            target_price = float(target)
+        except ValueError:
+            target_price = None
+        if target_price is not None and not math.isfinite(target_price):
+            await ctx.send(f"❌ {ctx.author.mention} The target price must be a finite number!")
+            return
+        if target_price is None or args:
+            await set_condition_alert(ctx, subnet_uid, target.lower(), args, notify)
+            return
+        
+        logger.debug(f"Setting alert for subnet {subnet_uid} with target price {target_price}")
         # Validate subnet exists
         try:
             # First check if subnet exists
-            subnet_info = subtensor.subnet(subnet_uid)
-            if subnet_info is None:
-                print(f"Subnet {subnet_uid} returned None")
+            subnet_snapshot = await get_subnet_snapshot(subnet_uid)
+            if subnet_snapshot is None:
+                logger.warning(f"Subnet {subnet_uid} not found in price snapshot")
                 await ctx.send(f"❌ {ctx.author.mention} Subnet {subnet_uid} does not exist!")
                 return
                 
-            # Try to get the price to verify subnet is active
-            try:
-                current_price = float(subnet_info.price)
-                print(f"Current price for subnet {subnet_uid}: {current_price}")
-            except Exception as e:
-                print(f"Error getting price for subnet {subnet_uid}: {e}")
-                await ctx.send(f"❌ {ctx.author.mention} Could not get price for subnet {subnet_uid}. It might be inactive.")
-                return
+            current_price = subnet_snapshot[0]
+            logger.debug(f"Current price for subnet {subnet_uid}: {current_price}")
             
             # If target price equals current price, send alert immediately via DM
             if target_price == current_price:
                 try:
-                    await ctx.author.send(
+                    message = (
                         f"🚨 **Price Alert for Subnet {subnet_uid}** 🚨\n"
                         f"Target Price: {target_price:.4f} τ\n"
                         f"Current Price: {current_price:.4f} τ\n"
                         f"Price matched target price immediately!"
                     )
-                    
-                    # Add to alert history
-                    if subnet_uid not in alert_history:
-                        alert_history[subnet_uid] = []
-                    alert_history[subnet_uid].append({
+                    entry = {
                         'user_id': ctx.author.id,
                         'target_price': target_price,
                         'initial_price': current_price,
                         'triggered_price': current_price,
                         'direction': 'matched',
                         'timestamp': datetime.now().isoformat()
-                    })
-                    save_alerts()  # Save the history
+                    }
+                    targets = alert_targets({'notify': notify})
+                    # Targets other than DMs get it like any triggered alert
+                    others = [name for name in targets if name != 'dm']
+                    if others:
+                        dispatch_notifications([{
+                            'subnet': subnet_uid,
+                            'user_id': ctx.author.id,
+                            'alert': {'notify': others},
+                            'entry': entry,
+                            'message': message
+                        }])
+                    if 'dm' in targets:
+                        await ctx.author.send(message)
+                    
+                    # Add to alert history
+                    record_history(subnet_uid, entry)
                 except Exception as e:
-                    print(f"Error sending DM to user: {e}")
+                    logger.error(f"Error sending DM to user: {e}")
                     await ctx.send(f"❌ {ctx.author.mention} I couldn't send you a DM. Please check your privacy settings.")
                 return
                     
         except Exception as e:
-            print(f"Error validating subnet {subnet_uid}: {e}")
+            logger.error(f"Error validating subnet {subnet_uid}: {e}")
             await ctx.send(f"❌ {ctx.author.mention} Error validating subnet {subnet_uid}: {str(e)}")
             return
             
-        # Initialize alerts for this subnet if needed
-        if subnet_uid not in price_alerts:
-            price_alerts[subnet_uid] = {}
-            
-        # Initialize user's alerts for this subnet if needed
-        if ctx.author.id not in price_alerts[subnet_uid]:
-            price_alerts[subnet_uid][ctx.author.id] = []
-            
         # Add new alert to user's alerts for this subnet
-        price_alerts[subnet_uid][ctx.author.id].append({
+        add_alert(subnet_uid, ctx.author.id, {
             'target_price': target_price,
-            'initial_price': current_price
+            'initial_price': current_price,
+            **({'notify': notify} if notify else {})
         })
         
-        # Save alerts after adding new one
-        save_alerts()
-        print(f"Alert saved: {price_alerts}")
+        # The journal already holds the new alert; compact it into the snapshot when it grows
+        maybe_compact_alerts()
+        logger.info(f"Alert saved for user {ctx.author.id} on subnet {subnet_uid}")
         
         # Determine alert type
         alert_type = "increase" if target_price > current_price else "decrease"
@@ -335,173 +3354,434 @@ async def set_alert(ctx, subnet_uid: int, target_price: float):
             f"Current Price: {current_price:.4f} τ\n"
             f"Target Price: {target_price:.4f} τ\n"
             f"Alert Type: Price {alert_type}\n"
-            f"You will receive a DM when the price {alert_type}s to this value."
+            f"You will be notified {describe_targets(notify)} when the price {alert_type}s to this value."
         )
     except Exception as e:
-        print(f"Error setting alert: {e}")
+        logger.error(f"Error setting alert: {e}")
         await ctx.send(f"❌ {ctx.author.mention} Error setting alert: {e}")
 
+def parse_notify_targets(args) -> Tuple[Optional[List[str]], Tuple[str, ...]]:
+    """Split a `to:name,name` argument off the command arguments, checking the names are configured targets"""
+    notify = None
+    rest = []
+    for arg in args:
+        if arg.lower().startswith('to:'):
+            notify = [name.strip() for name in arg[3:].split(',') if name.strip()]
+            unknown = [name for name in notify if name not in notifiers]
+            if unknown or not notify:
+                raise commands.BadArgument(
+                    f"Unknown notification target {', '.join(unknown) or '(none)'}. "
+                    f"Available targets: {', '.join(notifiers)}"
+                )
+        else:
+            rest.append(arg)
+    return notify, tuple(rest)
+
+def describe_targets(notify: Optional[List[str]]) -> str:
+    """How an alert's owner hears about it, for confirmations"""
+    targets = notify or NOTIFY_DEFAULT_TARGETS
+    if targets == ['dm']:
+        return "by DM"
+    return "via " + ", ".join("DM" if name == 'dm' else name for name in targets)
+
+async def set_condition_alert(ctx, subnet_uid: int, kind: str, args, notify: Optional[List[str]] = None):
+    """Handle `!setalert <subnet> pct <percent> <window>`, `ma <window>` and `vol <percent> <window>`"""
+    usage = (
+        "Usage: `!setalert <subnet> <target_price>`, `!setalert <subnet> pct <±percent> <window>`, "
+        "`!setalert <subnet> ma <window>` or `!setalert <subnet> vol <percent> <window>`"
+    )
+    try:
+        if kind == 'ma' and len(args) == 1:
+            threshold, window = 0.0, parse_window(args[0])
+        elif kind in ('pct', 'vol') and len(args) == 2:
+            threshold, window = float(args[0]), parse_window(args[1])
+        else:
+            raise commands.BadArgument(f"Unknown alert type: {kind}")
+        if kind == 'pct' and threshold == 0 or kind == 'vol' and threshold <= 0:
+            raise commands.BadArgument("The percentage must not be zero")
+    except (commands.BadArgument, ValueError) as e:
+        await ctx.send(f"❌ {ctx.author.mention} {e}\n{usage}")
+        return
+    
+    if await get_subnet_snapshot(subnet_uid) is None:
+        await ctx.send(f"❌ {ctx.author.mention} Subnet {subnet_uid} does not exist!")
+        return
+    
+    add_condition_alert({
+        'subnet': subnet_uid,
+        'user_id': ctx.author.id,
+        'type': kind,
+        'threshold': threshold,
+        'window': window,
+        **({'notify': notify} if notify else {})
+    })
+    maybe_compact_alerts()
+    logger.info(f"Condition alert saved for user {ctx.author.id} on subnet {subnet_uid}")
+    
+    await ctx.send(
+        f"✅ {ctx.author.mention} Alert set for Subnet {subnet_uid}!\n"
+        f"Alert Type: {describe_condition(kind, threshold, window)}\n"
+        f"You will be notified {describe_targets(notify)} when this happens."
+    )
+
+def describe_condition(kind: str, threshold: float, window: float) -> str:
+    """Describe a condition alert for humans"""
+    if kind == 'pct':
+        return f"Price moves {threshold:+g}% within {format_window(window)}"
+    if kind == 'ma':
+        return f"Price crosses its {format_window(window)} moving average"
+    return f"Volatility above {threshold:g}% over {format_window(window)}"
+
 @bot.command(name='myalerts')
 @is_command_channel()
+@requires_state()
 async def list_alerts(ctx):
     """List all alerts set by the user"""
     try:
         user_alerts = []
-        for subnet_uid, alerts in price_alerts.items():
-            if ctx.author.id in alerts:
-                # Get subnet info for the name
-                subnet_info = subtensor.subnet(subnet_uid)
-                subnet_name = subnet_info.subnet_name if subnet_info else "Unknown"
-                
-                # Get all alerts for this subnet
-                subnet_alerts = []
-                for alert_data in alerts[ctx.author.id]:
-                    if isinstance(alert_data, dict):
-                        target_price = alert_data['target_price']
-                        initial_price = alert_data['initial_price']
-                    else:
-                        # Handle old format
-                        target_price = alert_data
-                        initial_price = target_price
-                    
-                    alert_type = "increase" if target_price > initial_price else "decrease"
-                    
-                    subnet_alerts.append(
-                        f"  - Target: {target_price:.4f} τ\n"
-                        f"    Initial: {initial_price:.4f} τ\n"
-                        f"    Type: Price {alert_type}"
-                    )
+        conditions: Dict[int, List[Dict]] = {}
+        for alert in condition_alerts.user_alerts(ctx.author.id):
+            conditions.setdefault(alert['subnet'], []).append(alert)
+        price_alert_subnets = get_user_alerts(ctx.author.id)
+        for subnet_uid in sorted(set(price_alert_subnets) | set(conditions)):
+            alerts = price_alert_subnets.get(subnet_uid, [])
+            # Get subnet name from the price snapshot
+            subnet_snapshot = await get_subnet_snapshot(subnet_uid)
+            subnet_name = subnet_snapshot[1] if subnet_snapshot else "Unknown"
+            
+            # Get all alerts for this subnet
+            subnet_alerts = []
+            for alert_data in alerts:
+                target_price = alert_data['target_price']
+                initial_price = alert_data['initial_price']
+                alert_type = "increase" if target_price > initial_price else "decrease"
                 
-                if subnet_alerts:
-                    user_alerts.append(
-                        f"Subnet {subnet_uid} ({subnet_name}):\n" + "\n".join(subnet_alerts)
-                    )
+                subnet_alerts.append(
+                    f"  - Target: {target_price:.4f} τ\n"
+                    f"    Initial: {initial_price:.4f} τ\n"
+                    f"    Type: Price {alert_type}"
+                    + (f"\n    Notify: {', '.join(alert_data['notify'])}" if 'notify' in alert_data else "")
+                )
+            for alert in conditions.get(subnet_uid, []):
+                subnet_alerts.append(
+                    f"  - Type: {describe_condition(alert['type'], alert['threshold'], alert['window'])}"
+                    + (f"\n    Notify: {', '.join(alert['notify'])}" if 'notify' in alert else "")
+                )
+            
+            if subnet_alerts:
+                user_alerts.append(
+                    f"Subnet {subnet_uid} ({subnet_name}):\n" + "\n".join(subnet_alerts)
+                )
         
         if not user_alerts:
             await ctx.send(f"{ctx.author.mention} You have no active price alerts.")
         else:
-            message = f"{ctx.author.mention} **Your Active Price Alerts**\n\n" + "\n\n".join(user_alerts)
-            
-            # Split message if too long
-            if len(message) > 2000:
-                parts = [message[i:i+2000] for i in range(0, len(message), 2000)]
-                for part in parts:
-                    await ctx.send(part)
-                    await asyncio.sleep(0.5)  # Small delay between messages
-            else:
-                await ctx.send(message)
+            # Send in pages that only break between lines; discord.py paces the sends
+            blocks = [f"{ctx.author.mention} **Your Active Price Alerts**"] + user_alerts
+            for page in split_message(blocks):
+                await ctx.send(page)
     except Exception as e:
-        print(f"Error listing alerts: {e}")
+        logger.error(f"Error listing alerts: {e}")
         await ctx.send(f"❌ {ctx.author.mention} Error listing alerts: {e}")
 
 @bot.command(name='removealert')
 @is_command_channel()
+@requires_state()
 async def remove_alert(ctx, subnet_uid: int):
     """Remove a price alert for a specific subnet"""
     try:
-        if subnet_uid in price_alerts and ctx.author.id in price_alerts[subnet_uid]:
-            del price_alerts[subnet_uid][ctx.author.id]
-            if not price_alerts[subnet_uid]:
-                del price_alerts[subnet_uid]
-            # Save alerts after removing one
-            save_alerts()
+        if remove_user_alerts(subnet_uid, ctx.author.id):
+            maybe_compact_alerts()
             await ctx.send(f"✅ Alert removed for Subnet {subnet_uid}")
         else:
             await ctx.send(f"❌ No active alert found for Subnet {subnet_uid}")
     except Exception as e:
         await ctx.send(f"❌ Error removing alert: {e}")
 
+def parse_history_args(args) -> Tuple[Optional[int], int, Dict]:
+    """Parse `[subnet|all] [page] [user:@someone] [from:YYYY-MM-DD] [to:YYYY-MM-DD]`"""
+    subnet_uid = None
+    page = 1
+    filters = {}
+    positional = []
+    for arg in args:
+        key, _, value = arg.partition(':')
+        if not value:
+            positional.append(arg)
+        elif key == 'user':
+            match = re.fullmatch(r'<@!?(\d+)>|(\d+)', value)
+            if match is None:
+                raise commands.BadArgument(f"Invalid user filter: {value}")
+            filters['user_id'] = int(match.group(1) or match.group(2))
+        elif key in ('from', 'to'):
+            try:
+                day = datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise commands.BadArgument(f"Invalid date {value}, expected YYYY-MM-DD")
+            if key == 'from':
+                filters['since'] = day.isoformat()
+            else:
+                filters['until'] = (day + timedelta(days=1)).isoformat()
+        else:
+            raise commands.BadArgument(f"Unknown filter: {key}")
+    if len(positional) > 2:
+        raise commands.BadArgument("Too many arguments")
+    if positional and positional[0].lower() != 'all':
+        if not positional[0].isdigit():
+            raise commands.BadArgument(f"Invalid subnet: {positional[0]}")
+        subnet_uid = int(positional[0])
+    if len(positional) == 2:
+        if not positional[1].isdigit() or int(positional[1]) < 1:
+            raise commands.BadArgument(f"Invalid page: {positional[1]}")
+        page = int(positional[1])
+    return subnet_uid, page, filters
+
+def build_history_page(subnet_uid: Optional[int], page: int, filters: Dict) -> Optional[Tuple[discord.Embed, bool]]:
+    """Build one page of alert history, reading only that page's entries; returns (embed, has_next)"""
+    entries = list(iter_alert_history(
+        subnet_uid, offset=(page - 1) * HISTORY_PAGE_SIZE, limit=HISTORY_PAGE_SIZE + 1, **filters
+    ))
+    if not entries:
+        return None
+    has_next = len(entries) > HISTORY_PAGE_SIZE
+    
+    lines = []
+    for subnet_id, alert in entries[:HISTORY_PAGE_SIZE]:
+        timestamp = datetime.fromisoformat(alert['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+        prefix = f"**Subnet {subnet_id}** " if subnet_uid is None else ""
+        lines.append(
+            f"{prefix}• {timestamp} - {user_mention(alert['user_id'])}\n"
+            f"  Target: {alert['target_price']:.4f} τ | "
+            f"Initial: {alert['initial_price']:.4f} τ | "
+            f"Triggered at: {alert['triggered_price']:.4f} τ\n"
+            f"Direction: {alert['direction']}"
+        )
+    
+    title = f"Alert History for Subnet {subnet_uid}" if subnet_uid is not None else "Alert History for All Subnets"
+    embed = discord.Embed(title=title, description="\n\n".join(lines))
+    embed.set_footer(text=f"Page {page}")
+    return embed, has_next
+
+class HistoryPager(discord.ui.View):
+    """Previous/next buttons for !alert_history; each click builds only the requested page"""
+
+    def __init__(self, author_id: int, subnet_uid: Optional[int], filters: Dict, page: int, has_next: bool):
+        super().__init__(timeout=300)
+        self.author_id = author_id
+        self.subnet_uid = subnet_uid
+        self.filters = filters
+        self.page = page
+        self.update_buttons(has_next)
+
+    def update_buttons(self, has_next: bool):
+        self.previous_page.disabled = self.page <= 1
+        self.next_page.disabled = not has_next
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        result = build_history_page(self.subnet_uid, page, self.filters)
+        if result is None:
+            await interaction.response.defer()
+            return
+        embed, has_next = result
+        self.page = page
+        self.update_buttons(has_next)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label='◀ Previous', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label='Next ▶', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
 @bot.command(name='alert_history')
 @is_command_channel()
-async def show_alert_history(ctx, subnet_uid: int = None):
-    """Show alert history for a specific subnet or all subnets"""
+@requires_state()
+async def show_alert_history(ctx, *args: str):
+    """Show alert history for a specific subnet or all subnets, one page at a time"""
     try:
-        if not alert_history:
+        try:
+            subnet_uid, page, filters = parse_history_args(args)
+        except commands.BadArgument as e:
+            await ctx.send(
+                f"❌ {e}\n"
+                f"Usage: `!alert_history [subnet|all] [page] [user:@someone] [from:YYYY-MM-DD] [to:YYYY-MM-DD]`"
+            )
+            return
+        
+        if not has_alert_history():
             await ctx.send("No alert history available yet.")
             return
             
-        if subnet_uid is not None:
-            # Show history for specific subnet
-            if subnet_uid not in alert_history:
-                await ctx.send(f"No alert history found for Subnet {subnet_uid}.")
-                return
-                
-            history = alert_history[subnet_uid]
-            message = f"**Alert History for Subnet {subnet_uid}**\n\n"
-            for alert in history:
-                user = await bot.fetch_user(alert['user_id'])
-                timestamp = datetime.fromisoformat(alert['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
-                message += (
-                    f"• {timestamp} - {user.mention}\n"
-                    f"  Target: {alert['target_price']:.4f} τ | "
-                    f"Initial: {alert['initial_price']:.4f} τ | "
-                    f"Triggered at: {alert['triggered_price']:.4f} τ\n"
-                    f"Direction: {alert['direction']}\n"
-                )
-        else:
-            # Show history for all subnets
-            message = "**Alert History for All Subnets**\n\n"
-            for subnet_id, history in alert_history.items():
-                message += f"**Subnet {subnet_id}**\n"
-                for alert in history:
-                    user = await bot.fetch_user(alert['user_id'])
-                    timestamp = datetime.fromisoformat(alert['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
-                    message += (
-                        f"• {timestamp} - {user.mention}\n"
-                        f"  Target: {alert['target_price']:.4f} τ | "
-                        f"Initial: {alert['initial_price']:.4f} τ | "
-                        f"Triggered at: {alert['triggered_price']:.4f} τ\n"
-                        f"Direction: {alert['direction']}\n"
-                    )
-                message += "\n"
+        if subnet_uid is not None and not has_alert_history(subnet_uid):
+            await ctx.send(f"No alert history found for Subnet {subnet_uid}.")
+            return
         
-        # Split message if too long
-        if len(message) > 2000:
-            parts = [message[i:i+2000] for i in range(0, len(message), 2000)]
-            for part in parts:
-                await ctx.send(part)
-                await asyncio.sleep(0.5)
-        else:
-            await ctx.send(message)
+        result = build_history_page(subnet_uid, page, filters)
+        if result is None:
+            await ctx.send(f"No alert history found on page {page} for these filters.")
+            return
+        
+        embed, has_next = result
+        await ctx.send(embed=embed, view=HistoryPager(ctx.author.id, subnet_uid, filters, page, has_next))
             
     except Exception as e:
-        print(f"Error showing alert history: {e}")
+        logger.error(f"Error showing alert history: {e}")
         await ctx.send(f"❌ Error showing alert history: {e}")
 
+@bot.command(name='alert_summary')
+@is_command_channel()
+@requires_state()
+async def show_alert_summary(ctx, subnet: str = 'all', days: int = 30):
+    """Show daily trigger counts and price ranges, including history older than the retention window"""
+    try:
+        subnet_uid = None if subnet.lower() == 'all' else int(subnet)
+        summary = history_summary(subnet_uid, max(1, days))
+        if not summary:
+            scope = "any subnet" if subnet_uid is None else f"Subnet {subnet_uid}"
+            await ctx.send(f"No alert triggers for {scope} in the last {days} days.")
+            return
+        
+        if subnet_uid is not None:
+            header = f"**Subnet {subnet_uid} triggers, last {days} days**"
+            lines = [f"`{day}` {count} triggers, {low:.4f}–{high:.4f} τ"
+                     for day, (count, low, high) in sorted(summary.get(subnet_uid, {}).items(), reverse=True)]
+        else:
+            header = f"**Triggers per subnet, last {days} days**"
+            lines = []
+            for subnet_id, days_rollups in sorted(summary.items()):
+                rollups = list(days_rollups.values())
+                lines.append(
+                    f"Subnet {subnet_id}: {sum(rollup[0] for rollup in rollups)} triggers, "
+                    f"{min(rollup[1] for rollup in rollups):.4f}–{max(rollup[2] for rollup in rollups):.4f} τ"
+                )
+        for page in split_message(["\n".join([header] + lines)]):
+            await ctx.send(page)
+    except ValueError:
+        await ctx.send("❌ Usage: `!alert_summary [subnet|all] [days]`")
+    except Exception as e:
+        logger.error(f"Error showing alert summary: {e}")
+        await ctx.send(f"❌ Error showing alert summary: {e}")
+
 @bot.command(name='price')
 @is_command_channel()
 async def get_subnet_price(ctx, subnet_uid: int):
     """Get current price of a specific subnet"""
     try:
-        print(f"Getting price for subnet {subnet_uid} (requested by {ctx.author.name})")
-        # Get subnet info
-        subnet_info = subtensor.subnet(subnet_uid)
-        if subnet_info is None:
-            print(f"Subnet {subnet_uid} returned None")
+        logger.debug(f"Getting price for subnet {subnet_uid} (requested by {ctx.author.name})")
+        # Get subnet price and name from the snapshot
+        subnet_snapshot = await get_subnet_snapshot(subnet_uid)
+        if subnet_snapshot is None:
+            logger.warning(f"Subnet {subnet_uid} not found in price snapshot")
             await ctx.send(f"❌ {ctx.author.mention} Subnet {subnet_uid} does not exist!")
             return
             
-        try:
-            current_price = float(subnet_info.price)
-            subnet_name = subnet_info.subnet_name
-            print(f"Successfully got price for subnet {subnet_uid}: {current_price}")
-        except Exception as e:
-            print(f"Error getting price for subnet {subnet_uid}: {e}")
-            await ctx.send(f"❌ {ctx.author.mention} Could not get price for subnet {subnet_uid}. It might be inactive.")
-            return
+        current_price, subnet_name, block = subnet_snapshot
+        logger.debug(f"Successfully got price for subnet {subnet_uid}: {current_price} (block {block})")
             
         # Format the message
         message = (
             f"**Subnet {subnet_uid} ({subnet_name})**\n"
             f"Current Price: {current_price:.4f} τ\n"
+            f"Block: {block}\n"
             f"Requested by: {ctx.author.mention}"
         )
         
         await ctx.send(message)
     except Exception as e:
-        print(f"Error getting subnet price: {e}")
+        logger.error(f"Error getting subnet price: {e}")
         await ctx.send(f"❌ {ctx.author.mention} Error getting price for subnet {subnet_uid}: {e}")
 
+def parse_window(window: str) -> float:
+    """Parse a window like 90s, 30m, 1h or 7d into seconds"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smhd])', window.strip().lower())
+    if match is None:
+        raise commands.BadArgument(f"Invalid window {window}, use e.g. 30m, 1h or 1d")
+    return float(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+def sparkline(values: List[float], width: int = 40) -> str:
+    """Draw values as a one-line block chart, averaging them down to at most `width` characters"""
+    bars = "▁▂▃▄▅▆▇█"
+    step = max(1, math.ceil(len(values) / width))
+    points = [sum(values[i:i + step]) / len(values[i:i + step]) for i in range(0, len(values), step)]
+    low, high = min(points), max(points)
+    if high == low:
+        return bars[len(bars) // 2] * len(points)
+    return "".join(bars[int((point - low) / (high - low) * (len(bars) - 1))] for point in points)
+
+@bot.command(name='change')
+@is_command_channel()
+@requires_state()
+async def show_price_change(ctx, subnet_uid: int, window: str = '1h'):
+    """Show how much a subnet's price moved over a window"""
+    try:
+        seconds = parse_window(window)
+        if price_history is None or price_history.price_before(subnet_uid, seconds) is None:
+            await ctx.send(f"❌ {ctx.author.mention} No price history recorded for Subnet {subnet_uid} yet.")
+            return
+        
+        _, then_timestamp, then_price = price_history.price_before(subnet_uid, seconds)
+        _, _, current_price = price_history.sample(subnet_uid, 0)
+        change = (current_price - then_price) / then_price * 100 if then_price else 0.0
+        since = datetime.fromtimestamp(then_timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        
+        await ctx.send(
+            f"**Subnet {subnet_uid} price change over {window}**\n"
+            f"Then ({since}): {then_price:.4f} τ\n"
+            f"Now: {current_price:.4f} τ\n"
+            f"Change: {change:+.2f}%"
+        )
+    except commands.BadArgument as e:
+        await ctx.send(f"❌ {ctx.author.mention} {e}")
+    except Exception as e:
+        logger.error(f"Error getting price change: {e}")
+        await ctx.send(f"❌ {ctx.author.mention} Error getting price change for subnet {subnet_uid}: {e}")
+
+@bot.command(name='chart')
+@is_command_channel()
+@requires_state()
+async def show_price_chart(ctx, subnet_uid: int, window: str = '1h'):
+    """Show a text chart of a subnet's price over a window"""
+    try:
+        seconds = parse_window(window)
+        samples = price_history.window(subnet_uid, seconds) if price_history is not None else []
+        if len(samples) < 2:
+            await ctx.send(f"❌ {ctx.author.mention} Not enough price history for Subnet {subnet_uid} over {window}.")
+            return
+        
+        prices = [price for _, _, price in samples]
+        await ctx.send(
+            f"**Subnet {subnet_uid} price over {window}** (blocks {samples[0][0]}-{samples[-1][0]})\n"
+            f"```\n{sparkline(prices)}\n```"
+            f"Low: {min(prices):.4f} τ | High: {max(prices):.4f} τ | Last: {prices[-1]:.4f} τ"
+        )
+    except commands.BadArgument as e:
+        await ctx.send(f"❌ {ctx.author.mention} {e}")
+    except Exception as e:
+        logger.error(f"Error drawing price chart: {e}")
+        await ctx.send(f"❌ {ctx.author.mention} Error drawing price chart for subnet {subnet_uid}: {e}")
+
 # Run the bot
 if __name__ == "__main__":
-    bot.run(DISCORD_TOKEN) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Bittensor subnet price alert bot")
+    parser.add_argument('--role', choices=['all', 'frontend', 'fetcher', 'evaluator'], default=PROCESS_ROLE,
+                        help="all runs everything in one process; the others are the parts of a sharded deployment")
+    parser.add_argument('--shard', type=int, default=0, help="evaluator shard number, 0 to SHARD_COUNT - 1")
+    args = parser.parse_args()
+    PROCESS_ROLE = args.role
+    if PROCESS_ROLE != 'all':
+        if not os.getenv('SHARD_AUTHKEY') or SHARD_AUTHKEY in PUBLIC_SHARD_AUTHKEYS:
+            parser.error("SHARD_AUTHKEY must be set to a shared secret of your own for a sharded deployment")
+        try:
+            shard_address()
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if PROCESS_ROLE in ('fetcher', 'evaluator'):
+        asyncio.run(run_shard_worker(PROCESS_ROLE, args.shard))
+    else:
+        bot.run(DISCORD_TOKEN) 
\ No newline at end of file
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('ALLOWED_SERVER_ID', '1')
+os.environ.setdefault('COMMAND_CHANNEL_ID', '2')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import bittensor_alerter  # noqa: E402
+
+
+@pytest.fixture
+def alerter(tmp_path, monkeypatch):
+    """The alerter module with empty state, keeping its files in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bittensor_alerter, 'alert_store', None)
+    monkeypatch.setattr(bittensor_alerter, 'shard_hub', None)
+    monkeypatch.setattr(bittensor_alerter, 'price_history', None)
+    monkeypatch.setattr(bittensor_alerter, 'journal_file', None)
+    monkeypatch.setattr(bittensor_alerter, 'journal_sync_pending', False)
+    bittensor_alerter.load_alerts()
+    bittensor_alerter.last_evaluated_prices.clear()
+    yield bittensor_alerter
+    if bittensor_alerter.journal_file is not None:
+        bittensor_alerter.journal_file.close()
@@ -0,0 +1,100 @@
+import asyncio
+import math
+import random
+
+import pytest
+
+
+def fires(alert: dict, price: float) -> bool:
+    """Plain reference: rising alerts fire at or above their target, the rest at or below"""
+    if alert['target_price'] > alert['initial_price']:
+        return price >= alert['target_price']
+    return price <= alert['target_price']
+
+
+def random_alert(rng: random.Random) -> dict:
+    # Few distinct values, so equal targets and target == initial come up often
+    return {'target_price': rng.choice([0.5, 1.0, 1.5, 2.0, 2.5, 3.0]),
+            'initial_price': rng.choice([0.75, 1.0, 1.75, 2.0, 2.75])}
+
+
+def key(pair) -> tuple:
+    user_id, alert = pair
+    return user_id, alert['target_price'], alert['initial_price']
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_pop_triggered_matches_linear_scan(alerter, seed):
+    rng = random.Random(seed)
+    alerts = [(rng.randrange(5), random_alert(rng)) for _ in range(rng.randrange(1, 30))]
+    index = alerter.AlertIndex()
+    split = rng.randrange(len(alerts) + 1)
+    index.extend(alerts[:split])
+    for user_id, alert in alerts[split:]:
+        index.add(user_id, alert)
+    # Values that must never reach the sorted arrays
+    index.add(9, {'target_price': float('nan'), 'initial_price': 1.0})
+    index.add(9, {'target_price': 2.0, 'initial_price': float('inf')})
+    index.extend([(9, {'target_price': float('-inf'), 'initial_price': 1.0})])
+
+    remaining = list(alerts)
+    for price in [rng.choice([0.25, 0.5, 1.0, 1.25, 2.0, 2.5, 3.0, 3.5]) for _ in range(4)]:
+        expected = sorted(key(pair) for pair in remaining if fires(pair[1], price))
+        remaining = [pair for pair in remaining if not fires(pair[1], price)]
+        assert sorted(key(pair) for pair in index.pop_triggered(price)) == expected
+        assert len(index) == len(remaining)
+    assert sorted((user_id, alert['target_price'], alert['initial_price'])
+                  for user_id, user_alerts in index.to_dict().items() for alert in user_alerts) == \
+        sorted(key(pair) for pair in remaining)
+
+
+def test_remove_and_remove_user(alerter):
+    index = alerter.AlertIndex()
+    index.extend([(1, {'target_price': 2.0, 'initial_price': 1.0}), (2, {'target_price': 2.0, 'initial_price': 1.0}),
+                  (1, {'target_price': 0.5, 'initial_price': 1.0})])
+    assert index.remove(2, {'target_price': 2.0, 'initial_price': 1.0})
+    assert not index.remove(2, {'target_price': 2.0, 'initial_price': 1.0})
+    assert index.remove_user(1) == 2
+    assert len(index) == 0
+
+
+def test_non_finite_alerts_on_disk_are_dropped(alerter, monkeypatch):
+    monkeypatch.setattr(alerter, 'SNAPSHOT_FORMAT', 'binary')
+
+    async def run():
+        alerter.add_alert(1, 7, {'target_price': 2.0, 'initial_price': 1.0})
+        alerter.add_alert(1, 8, {'target_price': 0.5, 'initial_price': 1.0})
+        # A NaN written into the raw columns by an older version, and one in the journal
+        falling = alerter.alert_index[1].falling
+        falling[0].insert(0, float('nan'))
+        falling[1].insert(0, 9)
+        falling[2].insert(0, 1.0)
+        falling[3].insert(0, 0)
+        alerter.save_alerts()
+        alerter.journal_append({'op': 'add', 'subnet': 1, 'user_id': 10, 'target_price': float('nan'), 'initial_price': 1.0})
+        alerter.sync_journal()
+    asyncio.run(run())
+
+    alerter.load_alerts()
+    assert alerter.price_alerts_snapshot() == {1: {7: [{'target_price': 2.0, 'initial_price': 1.0}],
+                                                   8: [{'target_price': 0.5, 'initial_price': 1.0}]}}
+    assert all(math.isfinite(target) for target in alerter.alert_index[1].falling[0])
+    assert [user_id for user_id, _ in alerter.alert_index[1].pop_triggered(0.4)] == [8]
+
+
+@pytest.mark.parametrize('target', ['nan', 'inf', '-inf'])
+def test_setalert_rejects_non_finite_targets(alerter, monkeypatch, target):
+    async def get_subnet_snapshot(subnet_uid):
+        return (1.0, 'alpha', 5)
+    monkeypatch.setattr(alerter, 'get_subnet_snapshot', get_subnet_snapshot)
+    sent = []
+
+    class Context:
+        author = type('Author', (), {'id': 7, 'mention': '<@7>'})()
+
+        async def send(self, content=None, **kwargs):
+            sent.append(content)
+
+    asyncio.run(alerter.set_alert.callback(Context(), 1, target))
+    assert "finite" in sent[0]
+    assert alerter.price_alerts_snapshot() == {}
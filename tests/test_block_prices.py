@@ -0,0 +1,115 @@
+import asyncio
+import queue
+
+import pytest
+
+
+class Value:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeSubstrate:
+    def __init__(self, subtensor):
+        self.subtensor = subtensor
+
+    def create_storage_key(self, pallet, item, params):
+        return (pallet, item, params[0])
+
+    def get_block_hash(self, block):
+        return f"0x{block:064x}"
+
+    def query_multi(self, keys, block_hash):
+        self.subtensor.calls.append(('query_multi', tuple(key[2] for key in keys[::2])))
+        tao, alpha_in = zip(*(self.subtensor.pools[key[2]] for key in keys[::2]))
+        values = [value for pair in zip(tao, alpha_in) for value in pair]
+        return [(key, Value(value)) for key, value in zip(keys, values)]
+
+
+class FakeSubnet:
+    def __init__(self, netuid, tao, alpha_in):
+        self.netuid = netuid
+        self.price = tao / alpha_in
+        self.subnet_name = f"subnet-{netuid}"
+
+
+class FakeSubtensor:
+    """Subtensor whose subnets are priced by their (SubnetTAO, SubnetAlphaIn) reserves"""
+
+    def __init__(self):
+        self.pools = {1: (1000, 1000), 2: (2000, 1000), 3: (500, 1000)}
+        self.calls = []
+        self.substrate = FakeSubstrate(self)
+
+    def all_subnets(self, block):
+        self.calls.append(('all_subnets', None))
+        return [FakeSubnet(netuid, *pool) for netuid, pool in self.pools.items()]
+
+    def subnet(self, netuid, block):
+        self.calls.append(('subnet', netuid))
+        return FakeSubnet(netuid, *self.pools[netuid])
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def subtensor(alerter, monkeypatch):
+    fake = FakeSubtensor()
+    monkeypatch.setattr(alerter.bt, 'subtensor', lambda config=None: fake)
+    # Pooled connections would outlive the test
+    monkeypatch.setattr(alerter.chain, 'connections', queue.Queue())
+    monkeypatch.setattr(alerter, 'block_prices', alerter.BlockPriceReader(3600))
+    return fake
+
+
+def test_blocks_read_reserves_and_fetch_only_changed_prices(alerter, subtensor, monkeypatch):
+    sent = []
+    monkeypatch.setattr(alerter.notifiers['dm'], 'submit',
+                        lambda notifications: sent.extend(n['user_id'] for n in notifications))
+
+    async def run():
+        alerter.add_alert(1, 7, {'target_price': 1.5, 'initial_price': 1.0})
+        alerter.add_alert(2, 8, {'target_price': 1.0, 'initial_price': 2.0})
+
+        # The first block takes a full snapshot and reads the reserves it will compare against
+        await alerter.check_changed_subnets(10)
+        assert subtensor.calls == [('all_subnets', None), ('query_multi', (1, 2))]
+        assert alerter.last_evaluated_prices == {1: 1.0, 2: 2.0}
+
+        # Only subnet 1's reserves move: it alone is fetched, and its alert fires
+        subtensor.calls.clear()
+        subtensor.pools[1] = (1600, 1000)
+        await alerter.check_changed_subnets(11)
+        assert subtensor.calls == [('query_multi', (1, 2)), ('subnet', 1)]
+        assert sent == [7]
+        assert (await alerter.price_cache.get(1))[0] == 1.6
+
+        # Unwatched subnets are not read at all; nothing watched moved, so nothing is fetched
+        subtensor.calls.clear()
+        subtensor.pools[3] = (900, 1000)
+        await alerter.check_changed_subnets(12)
+        assert subtensor.calls == [('query_multi', (2,))]
+
+        # Every full_interval a full snapshot still covers every subnet
+        subtensor.calls.clear()
+        alerter.block_prices.last_full = float('-inf')
+        subtensor.pools[2] = (900, 1000)
+        await alerter.check_changed_subnets(13)
+        assert subtensor.calls == [('all_subnets', None), ('query_multi', (2,))]
+        assert sorted(sent) == [7, 8]
+
+    asyncio.run(run())
+
+
+def test_reader_without_subnets_watches_the_full_snapshot(alerter, subtensor):
+    reader = alerter.BlockPriceReader(3600)
+
+    async def run():
+        assert set(await reader.read(10)) == {1, 2, 3}
+        subtensor.calls.clear()
+        subtensor.pools[3] = (900, 1000)
+        assert await reader.read(11) == {3: (0.9, 'subnet-3', 11)}
+        assert subtensor.calls == [('query_multi', (1, 2, 3)), ('subnet', 3)]
+
+    asyncio.run(run())
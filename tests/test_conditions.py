@@ -0,0 +1,183 @@
+import math
+import random
+import statistics
+
+import pytest
+
+CAPACITY = 16
+
+
+class Reference:
+    """Plain Python condition alerts over the same samples, kept as a list per subnet"""
+
+    def __init__(self):
+        self.samples = {}
+        self.sides = {}
+        self.block = 0
+
+    def record(self, subnet_uid: int, timestamp: float, price: float):
+        # The ring buffer only keeps the newest CAPACITY samples
+        self.samples[subnet_uid] = (self.samples.get(subnet_uid, []) + [(timestamp, price)])[-CAPACITY:]
+
+    def fires(self, alert: dict, now: float) -> bool:
+        samples = self.samples.get(alert['subnet'], [])
+        window = [price for timestamp, price in samples if timestamp >= now - alert['window']]
+        if alert['type'] == 'pct':
+            if len(window) < 2:
+                return False
+            change = (window[-1] - window[0]) / window[0] * 100
+            return change >= alert['threshold'] if alert['threshold'] >= 0 else change <= alert['threshold']
+        if alert['type'] == 'vol':
+            returns = [math.log(b / a) for a, b in zip(window, window[1:])]
+            return len(returns) >= 2 and statistics.stdev(returns) * 100 >= alert['threshold']
+        # Moving average: fires when the price moves to the other side of the window's mean
+        if len(window) < 2:
+            return False
+        average = sum(window) / len(window)
+        side = (window[-1] > average) - (window[-1] < average)
+        previous = self.sides.get(alert['id'], 0)
+        if side:
+            self.sides[alert['id']] = side
+        return bool(previous and side and side != previous)
+
+    def vol(self, alert: dict, now: float) -> float:
+        samples = self.samples.get(alert['subnet'], [])
+        window = [price for timestamp, price in samples if timestamp >= now - alert['window']]
+        returns = [math.log(b / a) for a, b in zip(window, window[1:])]
+        return statistics.stdev(returns) * 100 if len(returns) >= 2 else float('nan')
+
+
+@pytest.fixture
+def history(alerter, tmp_path):
+    return alerter.PriceHistory(str(tmp_path / 'prices.bin'), 4, CAPACITY)
+
+
+def scripted(history, reference, subnet_uid: int, samples):
+    """Record (timestamp, price) samples in both, each at a new block"""
+    for timestamp, price in samples:
+        reference.block += 1
+        history.record(subnet_uid, reference.block, timestamp, price)
+        reference.record(subnet_uid, timestamp, price)
+
+
+def fired_ids(conditions, history, now) -> list:
+    return sorted(alert['id'] for alert, _, _, _ in conditions.evaluate(history, now))
+
+
+def test_empty_history_fires_nothing(alerter, history):
+    conditions = alerter.ConditionAlerts()
+    for kind, threshold in (('pct', 0.0), ('pct', -0.0001), ('ma', 0.0), ('vol', 0.0)):
+        conditions.add({'subnet': 1, 'user_id': 7, 'type': kind, 'threshold': threshold, 'window': 3600.0})
+    assert fired_ids(conditions, history, 10_000.0) == []
+    assert len(conditions) == 4
+
+
+def test_window_longer_than_history_uses_every_sample(alerter, history):
+    reference = Reference()
+    # More samples than the ring holds; the oldest ones are overwritten
+    scripted(history, reference, 1, [(1000.0 + 60 * i, 1.0 + 0.1 * i) for i in range(CAPACITY + 5)])
+    conditions = alerter.ConditionAlerts()
+    alerts = [conditions.add({'subnet': 1, 'user_id': 7, 'type': 'pct', 'threshold': threshold, 'window': 1e9})
+              for threshold in (50.0, 80.0, 200.0)]
+    now = 1000.0 + 60 * (CAPACITY + 5)
+    expected = sorted(alert['id'] for alert in alerts if reference.fires(alert, now))
+    assert fired_ids(conditions, history, now) == expected
+    # The move since the oldest kept sample (1.5 -> 3.0) is 100%, not the 200% since the first one recorded
+    assert expected == [alerts[0]['id'], alerts[1]['id']]
+
+
+@pytest.mark.parametrize('threshold, fires', [(25.0, True), (25.000001, False), (-25.0, True), (-25.000001, False)])
+def test_pct_boundaries(alerter, history, threshold, fires):
+    reference = Reference()
+    # 2.0 -> 2.5 is exactly +25% and 2.0 -> 1.5 exactly -25%
+    final = 2.5 if threshold > 0 else 1.5
+    scripted(history, reference, 2, [(100.0, 2.0), (200.0, 2.2), (300.0, final)])
+    conditions = alerter.ConditionAlerts()
+    alert = conditions.add({'subnet': 2, 'user_id': 7, 'type': 'pct', 'threshold': threshold, 'window': 200.0})
+    assert reference.fires(alert, 300.0) == fires
+    assert fired_ids(conditions, history, 300.0) == ([alert['id']] if fires else [])
+
+
+def test_window_starts_at_its_boundary_sample(alerter, history):
+    reference = Reference()
+    scripted(history, reference, 2, [(100.0, 1.0), (200.0, 2.0), (300.0, 2.5)])
+    conditions = alerter.ConditionAlerts()
+    # A 200s window at t=300 includes the sample at exactly t=100: +150%; one just shorter starts at 2.0: +25%
+    included = conditions.add({'subnet': 2, 'user_id': 7, 'type': 'pct', 'threshold': 150.0, 'window': 200.0})
+    excluded = conditions.add({'subnet': 2, 'user_id': 8, 'type': 'pct', 'threshold': 150.0, 'window': 199.9})
+    assert [reference.fires(included, 300.0), reference.fires(excluded, 300.0)] == [True, False]
+    assert fired_ids(conditions, history, 300.0) == [included['id']]
+
+
+def test_ma_fires_on_crossing_in_either_direction(alerter, history):
+    reference = Reference()
+    conditions = alerter.ConditionAlerts()
+    up = conditions.add({'subnet': 1, 'user_id': 7, 'type': 'ma', 'threshold': 0.0, 'window': 1000.0})
+    down = conditions.add({'subnet': 3, 'user_id': 8, 'type': 'ma', 'threshold': 0.0, 'window': 1000.0})
+    scripted(history, reference, 1, [(100.0, 2.0), (200.0, 1.5), (300.0, 1.0)])
+    scripted(history, reference, 3, [(100.0, 1.0), (200.0, 1.5), (300.0, 2.0)])
+
+    # The first evaluation only learns which side of the average each subnet is on
+    assert [reference.fires(alert, 300.0) for alert in (up, down)] == [False, False]
+    assert fired_ids(conditions, history, 300.0) == []
+
+    # Subnet 1 rallies above its average, subnet 3 drops below its own
+    scripted(history, reference, 1, [(400.0, 3.0)])
+    scripted(history, reference, 3, [(400.0, 0.5)])
+    assert [reference.fires(alert, 400.0) for alert in (up, down)] == [True, True]
+    assert fired_ids(conditions, history, 400.0) == [up['id'], down['id']]
+
+
+def test_vol_matches_sample_standard_deviation(alerter, history):
+    reference = Reference()
+    scripted(history, reference, 1, [(100.0 * i, price) for i, price in enumerate([1.0, 1.1, 0.95, 1.2, 1.0], 1)])
+    conditions = alerter.ConditionAlerts()
+    probe = {'subnet': 1, 'window': 1000.0}
+    volatility = reference.vol(probe, 500.0)
+    below = conditions.add({'subnet': 1, 'user_id': 7, 'type': 'vol', 'threshold': volatility * 0.999, 'window': 1000.0})
+    conditions.add({'subnet': 1, 'user_id': 8, 'type': 'vol', 'threshold': volatility * 1.001, 'window': 1000.0})
+    # Two samples make one return, too few for a standard deviation
+    conditions.add({'subnet': 1, 'user_id': 9, 'type': 'vol', 'threshold': 0.0, 'window': 150.0})
+    assert fired_ids(conditions, history, 500.0) == [below['id']]
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_random_scripts_match_reference(alerter, history, seed):
+    rng = random.Random(seed)
+    reference = Reference()
+    conditions = alerter.ConditionAlerts()
+    now = 10_000.0
+    for subnet_uid in range(4):
+        # Some subnets stay empty, some overflow the ring
+        price = rng.uniform(0.5, 2.0)
+        timestamp = now - rng.uniform(0, 3000)
+        samples = []
+        for _ in range(rng.choice([0, 1, 2, 3, 8, CAPACITY, CAPACITY + 10])):
+            timestamp += rng.uniform(1, 120)
+            price *= math.exp(rng.gauss(0, 0.05))
+            samples.append((timestamp, price))
+        scripted(history, reference, subnet_uid, samples)
+    now = max([samples[-1][0] for samples in reference.samples.values() if samples] + [now]) + 1
+
+    alerts = []
+    for _ in range(30):
+        kind = rng.choice(['pct', 'ma', 'vol'])
+        threshold = {'pct': rng.uniform(-15, 15), 'ma': 0.0, 'vol': rng.uniform(0, 8)}[kind]
+        window = rng.choice([30.0, 300.0, 900.0, 3600.0, 1e9])
+        alerts.append(conditions.add({'subnet': rng.randrange(4), 'user_id': rng.randrange(100), 'type': kind,
+                                      'threshold': threshold, 'window': window}))
+
+    alive = list(alerts)
+    for round_number in range(3):
+        expected = sorted(alert['id'] for alert in alive if reference.fires(alert, now))
+        # Skip a vol alert whose threshold is within rounding of the measured value
+        if any(alert['type'] == 'vol' and abs(reference.vol(alert, now) - alert['threshold']) < 1e-9 for alert in alive):
+            return
+        assert fired_ids(conditions, history, now) == expected
+        alive = [alert for alert in alive if alert['id'] not in expected]
+        assert len(conditions) == len(alive)
+        # Move every subnet on, so moving-average alerts can cross
+        now += 60
+        for subnet_uid in range(4):
+            last = reference.samples.get(subnet_uid, [(0, rng.uniform(0.5, 2.0))])[-1][1]
+            scripted(history, reference, subnet_uid, [(now - 1, last * math.exp(rng.gauss(0, 0.2)))])
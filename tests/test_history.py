@@ -0,0 +1,78 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def entry(days_ago: float, price: float) -> dict:
+    timestamp = (datetime.now() - timedelta(days=days_ago)).replace(microsecond=0).isoformat()
+    return {'user_id': 1, 'target_price': 1.0, 'initial_price': 0.9, 'triggered_price': price,
+            'direction': 'increased', 'timestamp': timestamp}
+
+
+@pytest.mark.parametrize('store', ['json', 'sqlite'])
+def test_prune_history_in_batches(alerter, monkeypatch, store):
+    monkeypatch.setattr(alerter, 'ALERT_STORE', store)
+    monkeypatch.setattr(alerter, 'HISTORY_RETENTION_DAYS', 30)
+    monkeypatch.setattr(alerter, 'HISTORY_MAX_ENTRIES', 5)
+    monkeypatch.setattr(alerter, 'HISTORY_PRUNE_BATCH', 2)
+    archived = []
+    monkeypatch.setattr(alerter, 'write_history_archive', archived.append)
+
+    async def run():
+        alerter.load_alerts()
+        # Subnet 1: four entries past retention; subnet 2: three beyond HISTORY_MAX_ENTRIES
+        for days_ago, price in ((40, 1.0), (40, 2.0), (35, 3.0), (31, 4.0), (5, 5.0), (2, 6.0), (1, 7.0)):
+            alerter.record_history(1, entry(days_ago, price))
+        for i in range(8):
+            alerter.record_history(2, entry(8 - i, float(i)))
+        before = alerter.history_summary(None, 60)
+
+        await alerter.prune_history()
+
+        assert alerter.history_summary(None, 60) == before
+        assert [len(list(alerter.iter_alert_history(subnet_uid))) for subnet_uid in (1, 2)] == [3, 5]
+        assert [e['triggered_price'] for _, e in alerter.iter_alert_history(2)] == [3.0, 4.0, 5.0, 6.0, 7.0]
+        assert all(0 < len(batch) <= 2 for batch in archived)
+        assert sorted(e['triggered_price'] for batch in archived for _, e in batch) == [0.0, 1.0, 1.0, 2.0, 2.0, 3.0, 4.0]
+
+    try:
+        asyncio.run(run())
+    finally:
+        if alerter.alert_store is not None:
+            alerter.alert_store.conn.close()
+
+
+def test_condition_triggers_do_not_grow_directions(alerter, monkeypatch):
+    history = alerter.PriceHistory('prices.bin', 4, 16)
+    monkeypatch.setattr(alerter, 'price_history', history)
+    fixed = list(alerter.DIRECTIONS)
+
+    async def run():
+        now = time.time()
+        for step in range(6):
+            for kind, threshold in (('pct', 1.0 + step), ('pct', -1.0 - step), ('vol', 0.01)):
+                alerter.add_condition_alert({'subnet': 1 + (threshold < 0), 'user_id': 7, 'type': kind,
+                                             'threshold': threshold, 'window': 3600.0})
+            # Subnet 1 rallies and subnet 2 drops by a different amount every round
+            for subnet_uid, sign in ((1, 1), (2, -1)):
+                history.record(subnet_uid, 2 * step, now - 60, 1.0)
+                history.record(subnet_uid, 2 * step + 1, now, 1.0 + sign * (0.2 + 0.05 * step))
+            alerter.apply_triggers(alerter.evaluate_alerts({}, []))
+            now += 1
+    asyncio.run(run())
+
+    directions = [entry['direction'] for subnet_uid in (1, 2) for entry in alerter.history_snapshot()[subnet_uid]]
+    assert {'moved up', 'moved down', 'volatility above threshold'} <= set(directions)
+    assert alerter.DIRECTIONS == fixed
+
+
+def test_legacy_condition_directions_map_to_fixed_kinds(alerter):
+    fixed = list(alerter.DIRECTIONS)
+    assert alerter.DIRECTIONS[alerter.direction_code('moved +19.60% in 1h')] == 'moved up'
+    assert alerter.DIRECTIONS[alerter.direction_code('moved -3.00% in 5m')] == 'moved down'
+    assert alerter.DIRECTIONS[alerter.direction_code('volatility 0.02% over 1h')] == 'volatility above threshold'
+    assert alerter.DIRECTIONS[alerter.direction_code('crossed below its 1h moving average')] == \
+        'crossed below its moving average'
+    assert alerter.DIRECTIONS == fixed
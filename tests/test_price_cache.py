@@ -0,0 +1,26 @@
+import asyncio
+import gc
+import logging
+
+
+def test_failed_background_refresh_is_logged(alerter, monkeypatch, caplog):
+    async def call(method, *args):
+        raise ConnectionError("node down")
+    monkeypatch.setattr(alerter.chain, 'call', call)
+    monkeypatch.setattr(alerter.logger, 'propagate', True)
+    cache = alerter.PriceCache(ttl=0, max_stale=60)
+    cache.seed({1: (1.5, 'alpha', 5)})
+    loop_errors = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+        # A stale entry is served right away and refreshed in the background
+        assert await cache.get(1) == (1.5, 'alpha', 5)
+        while cache.in_flight:
+            await asyncio.sleep(0)
+        gc.collect()
+
+    with caplog.at_level(logging.WARNING, logger=alerter.logger.name):
+        asyncio.run(run())
+    assert "Error refreshing price of subnet 1: node down" in caplog.text
+    assert not loop_errors
@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import pytest
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_hub_fetcher_and_evaluators_in_one_process(alerter, monkeypatch):
+    monkeypatch.setattr(alerter, 'SHARD_COUNT', 2)
+    monkeypatch.setattr(alerter, 'CHECK_INTERVAL', 0.02)
+    monkeypatch.setattr(alerter, 'CHECK_JITTER', 0.0)
+    monkeypatch.setattr(alerter, 'PRICE_CHECK_MODE', 'poll')
+    sent = []
+    monkeypatch.setattr(alerter.notifiers['dm'], 'submit',
+                        lambda notifications: sent.extend(n['user_id'] for n in notifications))
+
+    prices = {2: (1.0, 'alpha', 5), 3: (1.0, 'beta', 5)}
+
+    async def refresh_price_snapshot(block=None):
+        return dict(prices)
+    monkeypatch.setattr(alerter, 'refresh_price_snapshot', refresh_price_snapshot)
+
+    async def run():
+        hub = alerter.ShardHub(2)
+        monkeypatch.setattr(alerter, 'shard_hub', hub)
+        # Subnet 2 belongs to shard 0 and subnet 3 to shard 1
+        alerter.add_alert(2, 7, {'target_price': 2.0, 'initial_price': 1.0})
+        alerter.add_alert(3, 8, {'target_price': 0.5, 'initial_price': 1.0})
+
+        workers = []
+        shards = [alerter.EvaluatorShard() for _ in range(2)]
+        for shard, state in enumerate(shards):
+            hub_end, evaluator_end = alerter.LocalChannel.pair()
+            hub.attach(hub_end)
+            evaluator_end.send({'type': 'hello', 'role': 'evaluator', 'shard': shard})
+            workers.append(asyncio.create_task(alerter.serve_evaluator(evaluator_end, state)))
+        await wait_for(lambda: len(hub.evaluators) == 2)
+
+        # Changes after connecting reach the owning shard only
+        alerter.add_alert(2, 9, {'target_price': 1.5, 'initial_price': 1.0})
+        alerter.add_alert(3, 10, {'target_price': 0.9, 'initial_price': 1.0})
+        alerter.remove_user_alerts(3, 10)
+        await wait_for(lambda: sum(len(index) for index in shards[0].alert_index.values()) == 2)
+        assert list(shards[0].alert_index) == [2]
+        assert list(shards[1].alert_index) == [3]
+        assert len(shards[1].alert_index[3]) == 1
+
+        hub_end, fetcher_end = alerter.LocalChannel.pair()
+        hub.attach(hub_end)
+        fetcher_end.send({'type': 'hello', 'role': 'fetcher'})
+        workers.append(asyncio.create_task(alerter.serve_fetcher(fetcher_end)))
+        await wait_for(lambda: hub.snapshots >= 1)
+        assert hub.remote_triggers == 0
+
+        prices.update({2: (1.7, 'alpha', 6), 3: (0.4, 'beta', 6)})
+        await wait_for(lambda: hub.remote_triggers == 2)
+        assert sorted(sent) == [8, 9]
+        assert alerter.price_alerts_snapshot() == {2: {7: [{'target_price': 2.0, 'initial_price': 1.0}]}}
+        assert [entry['user_id'] for entry in alerter.history_snapshot()[2]] == [9]
+
+        prices[2] = (2.5, 'alpha', 7)
+        await wait_for(lambda: hub.remote_triggers == 3)
+        assert alerter.price_alerts_snapshot() == {}
+        assert sorted(sent) == [7, 8, 9]
+
+        hub.stop()
+        hub_end.close()
+        await asyncio.wait_for(asyncio.gather(*workers), 5)
+        # Evaluating on the shards never touched the front end's own alerts
+        assert not alerter.last_evaluated_prices
+
+    asyncio.run(run())
+
+
+def test_tcp_address_needs_a_secret(alerter, monkeypatch):
+    monkeypatch.setattr(alerter, 'SHARD_ADDRESS', '127.0.0.1:7070')
+    for public_key in (alerter.DEFAULT_SHARD_AUTHKEY, b'change-me'):
+        monkeypatch.setattr(alerter, 'SHARD_AUTHKEY', public_key)
+        with pytest.raises(ValueError):
+            alerter.shard_address()
+    monkeypatch.setattr(alerter, 'SHARD_AUTHKEY', b'a-real-secret')
+    assert alerter.shard_address() == ('127.0.0.1', 7070)
+    monkeypatch.setattr(alerter, 'SHARD_ADDRESS', 'alerter.sock')
+    assert alerter.shard_address() == 'alerter.sock'
+
+
+def test_evaluator_condition_alerts_use_the_fetchers_history(alerter, monkeypatch, tmp_path):
+    monkeypatch.setattr(alerter, 'SHARD_COUNT', 1)
+    monkeypatch.setattr(alerter, 'CHECK_INTERVAL', 0.02)
+    monkeypatch.setattr(alerter, 'CHECK_JITTER', 0.0)
+    monkeypatch.setattr(alerter, 'PRICE_CHECK_MODE', 'poll')
+    monkeypatch.setattr(alerter, 'PRICE_HISTORY_SUBNETS', 8)
+    monkeypatch.setattr(alerter, 'PRICE_HISTORY_SAMPLES', 32)
+    sent = []
+    monkeypatch.setattr(alerter.notifiers['dm'], 'submit',
+                        lambda notifications: sent.extend(n['user_id'] for n in notifications))
+
+    # The fetcher recorded a rally from 1.0 before the evaluator ever connected
+    now = time.time()
+    alerter.open_price_history()
+    for block, age, price in ((1, 600, 1.0), (2, 300, 1.2), (3, 60, 1.4)):
+        alerter.price_history.record(2, block, now - age, price)
+    alerter.price_history.mm.flush()
+    prices = {2: (1.5, 'alpha', 4)}
+
+    async def refresh_price_snapshot(block=None):
+        return dict(prices)
+    monkeypatch.setattr(alerter, 'refresh_price_snapshot', refresh_price_snapshot)
+
+    async def run():
+        hub = alerter.ShardHub(1)
+        monkeypatch.setattr(alerter, 'shard_hub', hub)
+        alerter.add_condition_alert({'subnet': 2, 'user_id': 7, 'type': 'pct', 'threshold': 40.0, 'window': 3600.0})
+
+        fetcher_hub_end, fetcher_end = alerter.LocalChannel.pair()
+        hub.attach(fetcher_hub_end)
+        fetcher_end.send({'type': 'hello', 'role': 'fetcher'})
+        workers = [asyncio.create_task(alerter.serve_fetcher(fetcher_end))]
+        await wait_for(lambda: hub.fetcher is not None)
+
+        # Evaluating in its own directory: nothing but the hub tells it the history
+        shard = alerter.EvaluatorShard()
+        hub_end, evaluator_end = alerter.LocalChannel.pair()
+        hub.attach(hub_end)
+        evaluator_end.send({'type': 'hello', 'role': 'evaluator', 'shard': 0})
+        workers.append(asyncio.create_task(alerter.serve_evaluator(evaluator_end, shard)))
+
+        await wait_for(lambda: hub.remote_triggers == 1)
+        assert sent == [7]
+        assert [int(block) for block in shard.price_history.export(2)[:, 0]] == [1, 2, 3, 4]
+
+        hub.stop()
+        fetcher_hub_end.close()
+        await asyncio.wait_for(asyncio.gather(*workers), 5)
+
+    asyncio.run(run())
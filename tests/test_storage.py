@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+import pytest
+
+
+@pytest.mark.parametrize('snapshot_format', ['json', 'binary'])
+def test_crash_between_snapshot_renames(alerter, monkeypatch, snapshot_format):
+    monkeypatch.setattr(alerter, 'SNAPSHOT_FORMAT', snapshot_format)
+
+    async def run():
+        alerter.add_alert(2, 7, {'target_price': 2.0, 'initial_price': 1.0})
+        alerter.record_history(2, {'user_id': 7, 'target_price': 1.5, 'initial_price': 1.0, 'triggered_price': 1.6,
+                                   'direction': 'increased', 'timestamp': '2026-03-01T10:00:00'})
+        alerter.rotate_journal()
+        return alerter.snapshot_files()
+    files = asyncio.run(run())
+    expected = (alerter.price_alerts_snapshot(), alerter.history_snapshot())
+
+    # Die right after the first snapshot file is renamed into place
+    replace = os.replace
+    renamed = []
+
+    def crash_after_first_rename(src, dst):
+        if renamed:
+            raise KeyboardInterrupt
+        renamed.append(dst)
+        replace(src, dst)
+    monkeypatch.setattr(os, 'replace', crash_after_first_rename)
+    with pytest.raises(KeyboardInterrupt):
+        alerter.write_snapshot(files)
+    monkeypatch.setattr(os, 'replace', replace)
+
+    alerter.load_alerts()
+    assert (alerter.price_alerts_snapshot(), alerter.history_snapshot()) == expected
+    assert not os.path.exists(alerter.SNAPSHOT_COMMIT_FILE)
+    assert not os.path.exists(alerter.JOURNAL_COMPACTING_FILE)
+
+
+def test_crash_before_snapshot_commit(alerter, monkeypatch):
+    monkeypatch.setattr(alerter, 'SNAPSHOT_FORMAT', 'json')
+
+    async def run():
+        alerter.add_alert(2, 7, {'target_price': 2.0, 'initial_price': 1.0})
+        alerter.rotate_journal()
+        return alerter.snapshot_files()
+    files = asyncio.run(run())
+
+    def crash(path, data):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(alerter, 'write_file_atomic', crash)
+    with pytest.raises(KeyboardInterrupt):
+        alerter.write_snapshot(files)
+
+    # Nothing was committed, so the rotated journal still holds the alert
+    alerter.load_alerts()
+    assert alerter.price_alerts_snapshot() == {2: {7: [{'target_price': 2.0, 'initial_price': 1.0}]}}